@@ -19,6 +19,8 @@ mkdir -p ${INSTALL_DIR}
 # Copy bot files
 echo "Copying bot files..."
 cp bot/*.py ${INSTALL_DIR}/
+# Shared with the monitor so both draw from one RPC budget
+cp monitor/rpc_budget.py monitor/rpc_pool.py monitor/state_store.py ${INSTALL_DIR}/
 cp requirements.txt ${INSTALL_DIR}/
 cp .env ${INSTALL_DIR}/
 
@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 import discord
 from web3 import Web3
@@ -6,6 +7,8 @@ from discord.ext import tasks
 from dotenv import load_dotenv
 import logging
 
+from rpc_pool import PooledHTTPProvider, RpcPool, node_urls
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +31,9 @@ WORLD_GAME_BOT_TOKEN = os.getenv('WORLD_GAME_BOT_TOKEN')
 WORLD_PRIZE_BOT_TOKEN = os.getenv('WORLD_PRIZE_BOT_TOKEN')
 
 UPDATE_INTERVAL = 900  # 15 minutes in seconds
+# A snapshot younger than this is served from the cache, so bots ticking together share one fetch
+STATE_MAX_AGE = UPDATE_INTERVAL / 2
+RPC_MAX_WAIT = 60  # seconds an update may wait for RPC budget before it is skipped
 
 # Verify tokens exist
 required_tokens = {
@@ -41,27 +47,29 @@ for token_name, token in required_tokens.items():
     if not token:
         raise ValueError(f"Missing {token_name} in .env file")
 
-# Initialize Web3 connections
-eth_w3 = Web3(Web3.HTTPProvider(ETH_NODE_URL))
-world_w3 = Web3(Web3.HTTPProvider(WORLD_NODE_URL))
+# Initialize Web3 connections; each network fails over across its <NETWORK>_NODE_URLS and
+# spends from the RPC budget shared with the monitors
+eth_w3 = Web3(PooledHTTPProvider(RpcPool(node_urls('ETH_NODE_URL'), max_wait=RPC_MAX_WAIT)))
+world_w3 = Web3(PooledHTTPProvider(RpcPool(node_urls('WORLD_NODE_URL'), max_wait=RPC_MAX_WAIT)))
 
-# Contract ABI remains the same
+# Only getCurrentGameInfo is read, at most once per STATE_MAX_AGE per network; NetworkState
+# shares that snapshot with every status command and bot in between
 CONTRACT_ABI = [
     {
         "inputs": [],
-        "name": "currentGameNumber",
-        "outputs": [{"type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [{"type": "uint256"}],
-        "name": "gamePrizePool",
-        "outputs": [{"type": "uint256"}],
+        "name": "getCurrentGameInfo",
+        "outputs": [
+            {"name": "gameNumber", "type": "uint256"},
+            {"name": "difficulty", "type": "uint8"},
+            {"name": "prizePool", "type": "uint256"},
+            {"name": "drawTime", "type": "uint256"},
+            {"name": "timeUntilDraw", "type": "uint256"}
+        ],
         "stateMutability": "view",
         "type": "function"
     }
 ]
+GAME_INFO_FIELDS = ['gameNumber', 'difficulty', 'prizePool', 'drawTime', 'timeUntilDraw']
 
 # Initialize contracts
 eth_contract = eth_w3.eth.contract(address=ETH_CONTRACT_ADDRESS, abi=CONTRACT_ABI)
@@ -116,27 +124,54 @@ async def run_in_executor(func, *args):
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(None, func, *args)
 
-async def get_game_number(contract, network):
-    """Query current game number from smart contract"""
-    try:
-        game_number = await run_in_executor(
-            contract.functions.currentGameNumber().call
-        )
-        return f"{network} Game", f"#{game_number}"  # Returns tuple of (title, value)
-    except Exception as e:
-        logger.error(f"Error getting {network} game number: {str(e)}")
+class NetworkState:
+    """Game state of one network, fetched once per interval and shared by every StatusBot on it.
+
+    A single getCurrentGameInfo call returns the game number, difficulty,
+    prize pool and draw times together. Bots that update within
+    STATE_MAX_AGE of each other read the same snapshot, so they never
+    disagree and the network sees one call per interval however many
+    bots are attached.
+    """
+
+    def __init__(self, contract, network):
+        self.contract = contract
+        self.network = network
+        self.snapshot = None
+        self.fetched_at = None
+        self.lock = asyncio.Lock()
+
+    async def get(self):
+        """The current snapshot as a dict, or None if the last fetch failed"""
+        async with self.lock:
+            if self.fetched_at is None or time.monotonic() - self.fetched_at >= STATE_MAX_AGE:
+                await self._refresh()
+            return self.snapshot
+
+    async def _refresh(self):
+        try:
+            game_info = await run_in_executor(self.contract.functions.getCurrentGameInfo().call)
+            self.snapshot = dict(zip(GAME_INFO_FIELDS, game_info))
+        except Exception as e:
+            logger.error(f"Error getting {self.network} game state: {str(e)}")
+            # Cache the failure too, so the other bots don't retry it straight away
+            self.snapshot = None
+        self.fetched_at = time.monotonic()
+
+async def get_game_number(state, network):
+    """Current game number from the network's shared state"""
+    game_info = await state.get()
+    if game_info is None:
         return f"{network} Game", "Error"
+    return f"{network} Game", f"#{game_info['gameNumber']}"  # Returns tuple of (title, value)
 
-async def get_prize_pool(contract, w3, network):
-    """Query current prize pool from smart contract"""
+async def get_prize_pool(state, w3, network):
+    """Current prize pool from the network's shared state"""
     try:
-        current_game = await run_in_executor(
-            contract.functions.currentGameNumber().call
-        )
-        prize_pool_wei = await run_in_executor(
-            contract.functions.gamePrizePool(current_game).call
-        )
-        prize_pool_amount = w3.from_wei(prize_pool_wei, 'ether')
+        game_info = await state.get()
+        if game_info is None:
+            return f"{network} Prize", "Error"
+        prize_pool_amount = w3.from_wei(game_info['prizePool'], 'ether')
         
         # Use appropriate currency symbol based on network
         currency = "WLD" if network.upper() == "WORLD" else "ETH"
@@ -148,28 +183,32 @@ async def get_prize_pool(contract, w3, network):
 
 async def main():
     try:
+        # One shared state cache per network
+        eth_state = NetworkState(eth_contract, "Ethereum")
+        world_state = NetworkState(world_contract, "World")
+
         # Ethereum bots
         eth_game_bot = StatusBot(
-            update_func=lambda: get_game_number(eth_contract, "Ethereum"),
+            update_func=lambda: get_game_number(eth_state, "Ethereum"),
             bot_type="Game",
             network="Ethereum"
         )
         
         eth_prize_bot = StatusBot(
-            update_func=lambda: get_prize_pool(eth_contract, eth_w3, "Ethereum"),
+            update_func=lambda: get_prize_pool(eth_state, eth_w3, "Ethereum"),
             bot_type="Prize",
             network="Ethereum"
         )
 
         # World Chain bots
         world_game_bot = StatusBot(
-            update_func=lambda: get_game_number(world_contract, "World"),
+            update_func=lambda: get_game_number(world_state, "World"),
             bot_type="Game",
             network="World"
         )
         
         world_prize_bot = StatusBot(
-            update_func=lambda: get_prize_pool(world_contract, world_w3, "World"),
+            update_func=lambda: get_prize_pool(world_state, world_w3, "World"),
             bot_type="Prize",
             network="World"
         )
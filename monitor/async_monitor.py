@@ -0,0 +1,336 @@
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import aiohttp
+from web3 import AsyncWeb3
+from web3.exceptions import BlockNotFound
+
+from block_times import BlockTimestamps
+from event_registry import EVENT_REGISTRY
+from log_stream import AsyncLogStream
+from prize_counts import PrizeTierCounts
+from rpc_budget import RpcBudgetExceeded
+from rpc_pool import AsyncPooledHTTPProvider, RpcPool
+from ticket_index import PRIZE_TIERS, tier_keys
+from webhook_outbox import WebhookOutbox
+from webhook_queue import (
+    DiscordRateLimit, MessageBatch, WebhookChannels, MAX_ATTEMPTS, BATCH_LINGER,
+    DELIVERED, REJECTED, SERVER_ERROR, UNAVAILABLE, OUTAGE_RETRY_DELAY
+)
+from monitor import (
+    BLOCKS_PER_HOUR, CONFIRMATION_DEPTH, CONFIRMATION_TAG,
+    CHECK_INTERVAL, ETH_WS_URL, STREAM_RECONNECT_DELAY,
+    RPC_MAX_WAIT, LotteryMonitor
+)
+
+logger = logging.getLogger(__name__)
+
+FETCH_CONCURRENCY = 4  # Block windows fetched at once while catching up
+
+
+class AsyncWebhookManager(WebhookChannels):
+    """Webhook delivery on the event loop.
+
+    send_webhook only stages the embed, so handlers never wait on Discord.
+    Each webhook URL has its own asyncio.Queue, worker and rate-limit
+    bucket, which keeps messages in order within a channel while channels
+    are delivered concurrently; packing, rate-limit bookkeeping and outbox
+    updates are shared with the threaded WebhookQueue.
+    """
+
+    def __init__(self, tickets_webhook: str, events_webhook: str):
+        super().__init__(WebhookOutbox())
+        self.tickets_webhook = tickets_webhook
+        self.events_webhook = events_webhook
+        self.session = None
+        self.workers: List[asyncio.Task] = []
+        self.rate_limits: Dict[str, DiscordRateLimit] = {}
+
+    async def start(self) -> None:
+        self.session = aiohttp.ClientSession()
+        for webhook_url in (self.tickets_webhook, self.events_webhook):
+            if webhook_url not in self.channels:
+                self.channels[webhook_url] = asyncio.Queue()
+                self.rate_limits[webhook_url] = DiscordRateLimit()
+                self.workers.append(asyncio.create_task(self._deliver(webhook_url)))
+        self._replay()
+
+    async def close(self) -> None:
+        """Deliver everything still queued, then shut down"""
+        self.commit()
+        await asyncio.gather(*(channel.join() for channel in self.channels.values()))
+        for worker in self.workers:
+            worker.cancel()
+        await self.session.close()
+
+    def send_webhook(self, webhook_url: str, embed: Dict[str, Any]) -> bool:
+        self.put(webhook_url, embed)
+        return True
+
+    async def _next_batch(self, channel: asyncio.Queue,
+                          first: Tuple[int, Dict[str, Any]]) -> Tuple[list, Optional[tuple]]:
+        batch = MessageBatch(first)
+        deadline = time.monotonic() + BATCH_LINGER
+
+        while not batch.full():
+            try:
+                message = await asyncio.wait_for(channel.get(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                break
+            if not batch.add(message):
+                return batch.messages, message
+
+        return batch.messages, None
+
+    async def _send_batch(self, webhook_url: str, batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+        embeds = [embed for _, embed in batch]
+        result = await self._post(webhook_url, embeds)
+        while result == UNAVAILABLE:
+            logger.warning(f"Discord unavailable, retrying {len(embeds)} embeds in {OUTAGE_RETRY_DELAY}s")
+            await asyncio.sleep(OUTAGE_RETRY_DELAY)
+            result = await self._post(webhook_url, embeds)
+
+        if self._settle(webhook_url, batch, result):
+            for message in batch:
+                await self._send_batch(webhook_url, [message])
+
+    async def _deliver(self, webhook_url: str) -> None:
+        channel = self.channels[webhook_url]
+        held_over = None
+        while True:
+            first = held_over if held_over is not None else await channel.get()
+            batch, held_over = await self._next_batch(channel, first)
+            try:
+                await self._send_batch(webhook_url, batch)
+            except Exception as e:
+                logger.error(f"Failed to send webhook: {str(e)}")
+            finally:
+                for _ in batch:
+                    channel.task_done()
+
+    async def _post(self, webhook_url: str, embeds: List[Dict[str, Any]]) -> str:
+        payload = {"embeds": embeds}
+        titles = ', '.join(embed.get('title', 'No title') for embed in embeds)
+        rate_limit = self.rate_limits[webhook_url]
+
+        for attempt in range(MAX_ATTEMPTS):
+            await asyncio.sleep(self._take_slot(rate_limit))
+
+            try:
+                async with self.session.post(webhook_url, json=payload) as response:
+                    status = response.status
+                    headers = response.headers
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Webhook request failed: {str(e)}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            outcome = self._outcome(rate_limit, status, headers, text, titles)
+            if outcome in (DELIVERED, REJECTED):
+                return outcome
+            if outcome == SERVER_ERROR:
+                await asyncio.sleep(2 ** attempt)
+
+        return self._gave_up(titles)
+
+
+class AsyncLotteryMonitor(LotteryMonitor):
+    """LotteryMonitor on a single asyncio event loop.
+
+    Catch-up windows are fetched concurrently, then handled and committed
+    in block order, so the output matches the sync engine. Webhooks are
+    delivered in the background by AsyncWebhookManager.
+    """
+
+    def __init__(self):
+        logger.info("Initializing AsyncLotteryMonitor...")
+        self.config = self._load_config()
+        self.rpc_pool = RpcPool(self.config['node_urls'], max_wait=RPC_MAX_WAIT)
+        self.w3 = AsyncWeb3(AsyncPooledHTTPProvider(self.rpc_pool))
+        self.contract = self._initialize_contract()
+        self.webhook_manager = AsyncWebhookManager(
+            self.config['tickets_webhook'],
+            self.config['events_webhook']
+        )
+        # Timestamps and prize counts are fetched on the event loop by the _prefetch_* methods, so no batcher
+        self._initialize_processing(BlockTimestamps(), PrizeTierCounts(self.contract))
+
+        # The starting block needs the node, so without a cursor it is resolved in run_async
+        self.last_processed_block = self.cursor.load()
+        self._restore_ticket_digest()
+
+    async def _initialize_state(self) -> None:
+        if not await self.w3.is_connected():
+            raise ConnectionError("Failed to connect to Ethereum node")
+        logger.info("Successfully connected to Ethereum node")
+
+        if self.last_processed_block is None:
+            current_block = await self.w3.eth.block_number
+            self.last_processed_block = max(current_block - BLOCKS_PER_HOUR, 0)
+        logger.info(f"Starting from block {self.last_processed_block}")
+
+    async def _get_confirmed_block(self) -> int:
+        if CONFIRMATION_TAG:
+            return (await self.w3.eth.get_block(CONFIRMATION_TAG))['number']
+        return max(await self.w3.eth.block_number - CONFIRMATION_DEPTH, 0)
+
+    async def _get_block_hash(self, block_number: int) -> bytes:
+        try:
+            return (await self.w3.eth.get_block(block_number))['hash']
+        except BlockNotFound:
+            return b''
+
+    async def _check_for_reorg(self) -> None:
+        fork_block = await self.reorg_tracker.find_fork_point_async(self._get_block_hash)
+        if fork_block is None:
+            return
+
+        self._rewind(fork_block)
+
+    async def _get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        return await self.w3.eth.get_logs(self._log_filter(from_block, to_block))
+
+    async def get_events(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        return self._decode_events(await self.range_planner.fetch_async(from_block, to_block, self._get_logs))
+
+    async def _prefetch_block_times(self, block_numbers: Iterable[int]) -> None:
+        """Look up unknown block timestamps, a few headers at a time"""
+        missing = self.block_times.missing(block_numbers)
+        for i in range(0, len(missing), FETCH_CONCURRENCY):
+            chunk = missing[i:i + FETCH_CONCURRENCY]
+            headers = await asyncio.gather(
+                *(self.w3.eth.get_block(block_number) for block_number in chunk),
+                return_exceptions=True
+            )
+            self.block_times.store({
+                block_number: header['timestamp']
+                for block_number, header in zip(chunk, headers)
+                if not isinstance(header, Exception)
+            })
+
+    async def _prefetch_prize_counts(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Read the contract's tier counts for winning numbers among events, for the handler to find"""
+        prize_counts = self.event_handler.prize_counts
+        for event in events:
+            if event['event'] != 'WinningNumbersSet':
+                continue
+            args = event['args']
+            keys = tier_keys([args['number1'], args['number2'], args['number3']], args['etherball'])
+            if prize_counts.cached(args['gameNumber'], keys) is not None:
+                continue
+
+            counts = await asyncio.gather(
+                *(
+                    getattr(self.contract.functions, f"{tier}TicketCounts")(args['gameNumber'], keys[tier]).call()
+                    for tier in PRIZE_TIERS
+                ),
+                return_exceptions=True
+            )
+            failed = [count for count in counts if isinstance(count, Exception)]
+            if failed:
+                logger.warning(f"Could not read the prize tier counts of game {args['gameNumber']}: {failed[0]}")
+                continue
+            prize_counts.store(args['gameNumber'], keys, dict(zip(PRIZE_TIERS, counts)))
+
+    async def process_events(self) -> None:
+        """Process events in concurrently fetched batches"""
+        try:
+            if not await asyncio.to_thread(self.rpc_pool.has_budget, 'eth_getLogs'):
+                logger.info("Daily RPC budget exhausted, skipping this check")
+                return
+
+            current_block = await self._get_confirmed_block()
+            await self._check_for_reorg()
+
+            if current_block <= self.last_processed_block:
+                return
+
+            start_block = self.last_processed_block + 1
+
+            while start_block <= current_block:
+                if not await asyncio.to_thread(self.rpc_pool.has_budget, 'eth_getLogs'):
+                    logger.info("Daily RPC budget exhausted, resuming next check")
+                    return
+
+                windows = self._next_windows(start_block, current_block, FETCH_CONCURRENCY)
+                start_block = windows[-1][1] + 1
+
+                results = await asyncio.gather(
+                    *(self.get_events(from_block, to_block) for from_block, to_block in windows),
+                    return_exceptions=True
+                )
+
+                fetched = [event for events in results if not isinstance(events, Exception) for event in events]
+                await self._prefetch_block_times(event['blockNumber'] for event in fetched)
+                await self._prefetch_prize_counts(fetched)
+
+                # Handle and commit in block order; a failed window stops the pass at that window
+                for (from_block, to_block), events in zip(windows, results):
+                    if isinstance(events, Exception):
+                        raise events
+                    logger.info(f"Processing blocks {from_block} to {to_block}")
+                    self._handle_window(from_block, to_block, events)
+
+            self._finish_pass(current_block, await self._get_block_hash(current_block))
+
+        except RpcBudgetExceeded as e:
+            logger.warning(f"{str(e)}, resuming next check")
+        except Exception as e:
+            logger.error(f"Error processing events: {str(e)}", exc_info=True)
+
+    async def run_stream(self) -> None:
+        logger.info("Starting log streaming loop")
+
+        while True:
+            try:
+                async with AsyncLogStream(ETH_WS_URL, self.contract.address, self.event_topics) as stream:
+                    await self.process_events()
+                    last_poll = time.time()
+
+                    while True:
+                        timeout = max(CHECK_INTERVAL - (time.time() - last_poll), 0)
+                        log = await stream.next_log(timeout=timeout)
+                        if log is not None:
+                            await self._prefetch_block_times([int(log['blockNumber'], 16)])
+                            event = EVENT_REGISTRY.decode(log)
+                            if event is not None and not log.get('removed'):
+                                await self._prefetch_prize_counts([event])
+                            self.handle_streamed_log(log)
+
+                        if time.time() - last_poll >= CHECK_INTERVAL:
+                            await self.process_events()
+                            last_poll = time.time()
+
+            except Exception as e:
+                logger.error(f"Log stream interrupted: {str(e)}. Reconnecting in {STREAM_RECONNECT_DELAY}s")
+                await asyncio.sleep(STREAM_RECONNECT_DELAY)
+
+    async def run_async(self) -> None:
+        """run() on the event loop, delivering webhooks until it stops"""
+        await self._initialize_state()
+        await self.webhook_manager.start()
+
+        try:
+            if ETH_WS_URL:
+                await self.run_stream()
+                return
+
+            logger.info("Starting main monitoring loop")
+            while True:
+                start_time = time.time()
+                await self.process_events()
+
+                elapsed = time.time() - start_time
+                sleep_time = max(CHECK_INTERVAL - elapsed, 0)
+
+                logger.info(f"Processed events. Next check in {sleep_time/60:.1f} minutes")
+                await asyncio.sleep(sleep_time)
+        finally:
+            await self.webhook_manager.close()
+            await self.w3.provider.disconnect()
+
+    def run(self) -> None:
+        asyncio.run(self.run_async())
@@ -0,0 +1,113 @@
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from rpc_batch import RpcBatcher, RpcCallError
+from state_store import state_path
+
+logger = logging.getLogger(__name__)
+
+
+class BlockTimestamps:
+    """Block number -> on-chain timestamp, so embeds show when an event happened.
+
+    Lookups are deduplicated and fetched with one batched
+    eth_getBlockByNumber request per window, then kept in a bounded LRU.
+    With a filename they are also saved to SQLite, so replays and
+    restarts don't fetch the same headers again.
+    """
+
+    def __init__(self, batcher: Optional[RpcBatcher] = None, cache_size: int = 10000,
+                 filename: Optional[str] = 'block_times.db'):
+        self.batcher = batcher
+        self.cache_size = cache_size
+        self.cache: 'OrderedDict[int, int]' = OrderedDict()
+        # Backfill workers prefetch from their own threads
+        self.lock = threading.Lock()
+
+        self.db = None
+        if filename is not None:
+            self.db = sqlite3.connect(state_path(filename), check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS block_times (
+                    block_number INTEGER PRIMARY KEY,
+                    timestamp INTEGER NOT NULL
+                )
+            """)
+            self.db.commit()
+
+    def _cached(self, block_number: int) -> Optional[int]:
+        with self.lock:
+            return self._lookup(block_number)
+
+    def _lookup(self, block_number: int) -> Optional[int]:
+        timestamp = self.cache.get(block_number)
+        if timestamp is not None:
+            self.cache.move_to_end(block_number)
+            return timestamp
+
+        if self.db is None:
+            return None
+        row = self.db.execute(
+            "SELECT timestamp FROM block_times WHERE block_number = ?", (block_number,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._remember(block_number, row[0])
+        return row[0]
+
+    def _remember(self, block_number: int, timestamp: int) -> None:
+        self.cache[block_number] = timestamp
+        self.cache.move_to_end(block_number)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def missing(self, block_numbers: Iterable[int]) -> List[int]:
+        """Distinct block numbers whose timestamps aren't known yet"""
+        return [number for number in sorted(set(block_numbers)) if self._cached(number) is None]
+
+    def store(self, timestamps: Dict[int, int]) -> None:
+        """Remember fetched timestamps"""
+        with self.lock:
+            for block_number, timestamp in timestamps.items():
+                self._remember(block_number, timestamp)
+            if self.db is not None and timestamps:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO block_times (block_number, timestamp) VALUES (?, ?)",
+                    list(timestamps.items())
+                )
+                self.db.commit()
+
+    def prefetch(self, block_numbers: Iterable[int]) -> None:
+        """Fetch every unknown timestamp among block_numbers in one batched request"""
+        missing = self.missing(block_numbers)
+        if not missing or self.batcher is None:
+            return
+
+        results = self.batcher.call([('eth_getBlockByNumber', [hex(number), False]) for number in missing])
+        timestamps = {}
+        for block_number, header in zip(missing, results):
+            if isinstance(header, RpcCallError) or not header:
+                logger.warning(f"Could not get the timestamp of block {block_number}: {header}")
+                continue
+            timestamps[block_number] = int(header['timestamp'], 16)
+        self.store(timestamps)
+
+    def get(self, block_number: int) -> Optional[int]:
+        timestamp = self._cached(block_number)
+        if timestamp is None:
+            self.prefetch([block_number])
+            timestamp = self._cached(block_number)
+        return timestamp
+
+    def isoformat(self, block_number: int) -> str:
+        """Embed timestamp for a block, or the current time if it can't be looked up"""
+        timestamp = self.get(block_number)
+        if timestamp is None:
+            return datetime.utcnow().isoformat()
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
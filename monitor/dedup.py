@@ -0,0 +1,95 @@
+import sqlite3
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from state_store import state_path
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(event: Dict[str, Any]) -> Tuple[bytes, int]:
+    """(txHash, logIndex) uniquely identifies a log on the canonical chain"""
+    return bytes(event['transactionHash']), event['logIndex']
+
+
+class DeliveryIndex:
+    """Record of events whose notifications were already delivered.
+
+    Recently seen keys are answered from a bounded in-memory LRU; the full
+    set lives in a SQLite table keyed on (txHash, logIndex), so lookups stay
+    a primary-key probe however many events have been delivered. Marks and
+    forgets wait in memory until commit() writes them in one transaction,
+    so the live monitor and a backfill sharing the file don't hold its
+    write lock between commits.
+    """
+
+    def __init__(self, filename: str = 'delivered.db', cache_size: int = 100000):
+        self.cache_size = cache_size
+        self.cache: 'OrderedDict[Tuple[bytes, int], None]' = OrderedDict()
+        # key -> block number to insert, or None to delete, on the next commit()
+        self.pending: Dict[Tuple[bytes, int], Optional[int]] = {}
+
+        self.db = sqlite3.connect(state_path(filename), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS delivered (
+                tx_hash BLOB NOT NULL,
+                log_index INTEGER NOT NULL,
+                block_number INTEGER NOT NULL,
+                PRIMARY KEY (tx_hash, log_index)
+            ) WITHOUT ROWID
+        """)
+        self.db.commit()
+
+    def _remember(self, key: Tuple[bytes, int]) -> None:
+        self.cache[key] = None
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def seen(self, event: Dict[str, Any]) -> bool:
+        """Whether this event was already delivered"""
+        key = event_key(event)
+        if key in self.pending:
+            return self.pending[key] is not None
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return True
+
+        row = self.db.execute(
+            "SELECT 1 FROM delivered WHERE tx_hash = ? AND log_index = ?", key
+        ).fetchone()
+        if row is None:
+            return False
+
+        self._remember(key)
+        return True
+
+    def mark(self, event: Dict[str, Any]) -> None:
+        """Record that this event's notification was queued; saved on the next commit()"""
+        key = event_key(event)
+        self.pending[key] = event['blockNumber']
+        self._remember(key)
+
+    def commit(self) -> None:
+        """Persist marks, once their notifications are safely in the webhook outbox"""
+        if not self.pending:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO delivered (tx_hash, log_index, block_number) VALUES (?, ?, ?)",
+                [(*key, block_number) for key, block_number in self.pending.items() if block_number is not None]
+            )
+            self.db.executemany(
+                "DELETE FROM delivered WHERE tx_hash = ? AND log_index = ?",
+                [key for key, block_number in self.pending.items() if block_number is None]
+            )
+        self.pending.clear()
+
+    def forget(self, event: Dict[str, Any]) -> None:
+        """Drop an event, e.g. one that a reorg removed, so it is posted again if it reappears; saved on the next commit()"""
+        key = event_key(event)
+        self.pending[key] = None
+        self.cache.pop(key, None)
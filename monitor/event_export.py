@@ -0,0 +1,101 @@
+import os
+import gzip
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from eth_utils import encode_hex
+
+logger = logging.getLogger(__name__)
+
+MAX_RECORDS_PER_FILE = 500000
+MAX_FILE_AGE = 300  # seconds before a file with records in it is sealed anyway
+
+
+def json_value(value: Any) -> Any:
+    """JSON-friendly form of a decoded event value"""
+    if isinstance(value, (bytes, bytearray)):
+        return encode_hex(value)
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    return value
+
+
+def event_record(event: Dict[str, Any], timestamp: Optional[int] = None) -> Dict[str, Any]:
+    """One flat row per event: chain position first, then the event's own arguments"""
+    record = {
+        'event': event['event'],
+        'blockNumber': event['blockNumber'],
+        'blockTimestamp': timestamp,
+        'logIndex': event['logIndex'],
+        'transactionHash': json_value(event['transactionHash'])
+    }
+    for name, value in event['args'].items():
+        record[name] = json_value(value)
+    return record
+
+
+class EventFileWriter:
+    """Writes event records to rotated gzip JSONL files named after the blocks they cover.
+
+    Records go to a hidden .part file that is renamed once sealed, so every
+    visible file is complete and covers events-<first>-<last>.jsonl.gz
+    exactly. Callers seal at window boundaries and checkpoint only then;
+    .part files left behind by an interrupted run are removed on start,
+    since their blocks are exported again on resume.
+    """
+
+    def __init__(self, directory: str, first_block: int, prefix: str = 'events',
+                 max_records: int = MAX_RECORDS_PER_FILE, max_age: float = MAX_FILE_AGE):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_age = max_age
+        self.first_block = first_block
+        self.files: List[str] = []
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith(f".{prefix}-") and name.endswith('.part'):
+                logger.info(f"Removing unfinished export file {name}")
+                os.unlink(os.path.join(directory, name))
+
+        self.part_path = None
+        self.file = None
+        self.records = 0
+        self.opened_at = 0.0
+
+    def _open(self) -> None:
+        self.part_path = os.path.join(self.directory, f".{self.prefix}-{self.first_block:010d}.jsonl.gz.part")
+        self.file = gzip.open(self.part_path, 'wt', encoding='utf-8')
+        self.records = 0
+        self.opened_at = time.monotonic()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.file is None:
+            self._open()
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.records += 1
+
+    def is_empty(self) -> bool:
+        """Whether nothing was written since the last seal"""
+        return self.file is None
+
+    def should_rotate(self) -> bool:
+        if self.file is None:
+            return False
+        return self.records >= self.max_records or time.monotonic() - self.opened_at >= self.max_age
+
+    def seal(self, last_block: int) -> Optional[str]:
+        """Finish the current file as covering blocks up to last_block; the next one starts after it"""
+        path = None
+        if self.file is not None:
+            self.file.close()
+            path = os.path.join(self.directory, f"{self.prefix}-{self.first_block:010d}-{last_block:010d}.jsonl.gz")
+            os.replace(self.part_path, path)
+            self.files.append(path)
+            logger.info(f"Wrote {self.records} events to {path}")
+            self.file = None
+        self.first_block = last_block + 1
+        return path
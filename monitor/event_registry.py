@@ -0,0 +1,122 @@
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from eth_abi import decode as abi_decode
+from eth_utils import keccak, encode_hex, to_checksum_address
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+from contract_abi import CONTRACT_ABI
+
+# Indexed arguments of these kinds are stored as a hash of the value, not the value itself
+HASHED_INDEXED_TYPES = ('string', 'bytes', 'tuple')
+
+
+def _to_int(value: Any) -> Any:
+    """Accept both web3-formatted ints and raw JSON-RPC hex quantities"""
+    if isinstance(value, str):
+        return int(value, 16)
+    return value
+
+
+def _normalize(abi_type: str, value: Any) -> Any:
+    if abi_type == 'address':
+        return to_checksum_address(value)
+    if abi_type.startswith('address['):
+        return [to_checksum_address(item) for item in value]
+    if abi_type.endswith(']'):
+        return list(value)
+    return value
+
+
+class EventDecoder:
+    """Decoder for a single event, prepared once from its ABI entry"""
+
+    def __init__(self, event_abi: Dict[str, Any]):
+        self.name = event_abi['name']
+        self.signature = f"{self.name}({','.join([arg['type'] for arg in event_abi['inputs']])})"
+        self.topic0 = HexBytes(keccak(text=self.signature))
+        self.topic_hex = encode_hex(self.topic0)
+
+        self.indexed_inputs: List[Tuple[str, str]] = []
+        self.data_names: List[str] = []
+        self.data_types: List[str] = []
+        for arg in event_abi['inputs']:
+            if arg.get('indexed'):
+                self.indexed_inputs.append((arg['name'], arg['type']))
+            else:
+                self.data_names.append(arg['name'])
+                self.data_types.append(arg['type'])
+
+        self.arg_order = [arg['name'] for arg in event_abi['inputs']]
+
+    def _decode_topic(self, abi_type: str, topic: bytes) -> Any:
+        if abi_type.startswith(HASHED_INDEXED_TYPES) or abi_type.endswith(']'):
+            return HexBytes(topic)
+        return _normalize(abi_type, abi_decode([abi_type], topic)[0])
+
+    def decode(self, log: Dict[str, Any]) -> AttributeDict:
+        """Decode a log into the same shape as web3's ContractEvent.process_log"""
+        topics = [HexBytes(topic) for topic in log['topics']]
+        if len(topics) != len(self.indexed_inputs) + 1:
+            raise ValueError(f"Log has {len(topics)} topics, expected {len(self.indexed_inputs) + 1} for {self.name}")
+
+        values: Dict[str, Any] = {}
+        for (name, abi_type), topic in zip(self.indexed_inputs, topics[1:]):
+            values[name] = self._decode_topic(abi_type, topic)
+
+        if self.data_types:
+            decoded = abi_decode(self.data_types, HexBytes(log['data']))
+            for name, abi_type, value in zip(self.data_names, self.data_types, decoded):
+                values[name] = _normalize(abi_type, value)
+
+        return AttributeDict({
+            'args': AttributeDict({name: values[name] for name in self.arg_order}),
+            'event': self.name,
+            'logIndex': _to_int(log['logIndex']),
+            'transactionIndex': _to_int(log['transactionIndex']),
+            'transactionHash': HexBytes(log['transactionHash']),
+            'address': to_checksum_address(log['address']),
+            'blockHash': HexBytes(log['blockHash']),
+            'blockNumber': _to_int(log['blockNumber'])
+        })
+
+
+class EventRegistry:
+    """topic0 -> decoder lookup for every non-anonymous event in an ABI"""
+
+    def __init__(self, abi: List[Dict[str, Any]]):
+        self._by_topic: Dict[bytes, EventDecoder] = {}
+        self._by_name: Dict[str, EventDecoder] = {}
+
+        for entry in abi:
+            if entry.get('type') != 'event' or entry.get('anonymous'):
+                continue
+            decoder = EventDecoder(entry)
+            self._by_topic[bytes(decoder.topic0)] = decoder
+            self._by_name[decoder.name] = decoder
+
+    @property
+    def event_names(self) -> List[str]:
+        return list(self._by_name)
+
+    def decoder(self, event_name: str) -> EventDecoder:
+        return self._by_name[event_name]
+
+    def topics(self, event_names: Optional[Iterable[str]] = None) -> List[str]:
+        """Hex topic0 hashes for the given events (all events by default), ready for an eth_getLogs filter"""
+        if event_names is None:
+            event_names = self._by_name
+        return [self._by_name[name].topic_hex for name in event_names]
+
+    def decode(self, log: Dict[str, Any]) -> Optional[AttributeDict]:
+        """Decode a log, or return None if it isn't one of our events"""
+        if not log['topics']:
+            return None
+        decoder = self._by_topic.get(bytes(HexBytes(log['topics'][0])))
+        if decoder is None:
+            return None
+        return decoder.decode(log)
+
+
+# Built once at import time and shared by every monitor
+EVENT_REGISTRY = EventRegistry(CONTRACT_ABI)
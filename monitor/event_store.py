@@ -0,0 +1,142 @@
+import json
+import sqlite3
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from hexbytes import HexBytes
+
+from event_export import json_value
+from state_store import state_path
+
+logger = logging.getLogger(__name__)
+
+
+def _player(args: Dict[str, Any]) -> Optional[str]:
+    """The wallet an event is about, lowercased so lookups don't depend on checksum casing"""
+    address = args.get('player') or args.get('winner')
+    return address.lower() if address else None
+
+
+class EventStore:
+    """Every decoded contract event, kept locally so questions don't need the chain.
+
+    One row per log, keyed on (blockNumber, logIndex) and indexed by
+    gameNumber and player, with the event's arguments as JSON. Each block
+    window is written in one transaction, and rows from orphaned blocks
+    are dropped when a reorg is noticed. Several processes can share the
+    file: the live monitor, the backfill and anything reading from it.
+    """
+
+    def __init__(self, filename: str = 'events.db'):
+        self.db = sqlite3.connect(state_path(filename), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL,
+                tx_hash TEXT NOT NULL,
+                event TEXT NOT NULL,
+                game_number INTEGER,
+                player TEXT,
+                args TEXT NOT NULL,
+                block_hash TEXT,
+                PRIMARY KEY (block_number, log_index)
+            ) WITHOUT ROWID
+        """)
+        # Stores written before block hashes were kept get the column; their rows have none
+        if 'block_hash' not in {row[1] for row in self.db.execute("PRAGMA table_info(events)")}:
+            self.db.execute("ALTER TABLE events ADD COLUMN block_hash TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS events_by_game ON events (game_number, event)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS events_by_player ON events (player, game_number)")
+        self.db.commit()
+
+    def add_many(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Save a window's events in one transaction; saving an event again replaces it"""
+        rows = [
+            (
+                event['blockNumber'],
+                event['logIndex'],
+                json_value(event['transactionHash']),
+                event['event'],
+                event['args'].get('gameNumber'),
+                _player(event['args']),
+                json.dumps({name: json_value(value) for name, value in event['args'].items()}),
+                json_value(event.get('blockHash'))
+            )
+            for event in events
+        ]
+        if not rows:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO events "
+                "(block_number, log_index, tx_hash, event, game_number, player, args, block_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def remove(self, event: Dict[str, Any]) -> None:
+        """Drop one event, e.g. a log the node withdrew"""
+        with self.db:
+            self.db.execute(
+                "DELETE FROM events WHERE block_number = ? AND log_index = ?", (event['blockNumber'], event['logIndex'])
+            )
+
+    def remove_after(self, block_number: int) -> None:
+        """Drop every event above block_number, whose blocks a reorg orphaned"""
+        with self.db:
+            removed = self.db.execute("DELETE FROM events WHERE block_number > ?", (block_number,)).rowcount
+        if removed:
+            logger.info(f"Removed {removed} stored events after block {block_number}")
+
+    def iter_events(self, event_name: Optional[str] = None, game_number: Optional[int] = None,
+                    player: Optional[str] = None, limit: Optional[int] = None,
+                    from_block: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Stored events matching every given filter, in chain order, read as they are consumed"""
+        where, params = self._filters(event_name, game_number, player, from_block)
+        query = f"SELECT block_number, log_index, tx_hash, block_hash, event, args FROM events{where} " \
+                f"ORDER BY block_number, log_index"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        for block_number, log_index, tx_hash, block_hash, name, args in self.db.execute(query, params):
+            yield {
+                'event': name,
+                'blockNumber': block_number,
+                'logIndex': log_index,
+                'transactionHash': HexBytes(tx_hash),
+                'blockHash': HexBytes(block_hash) if block_hash else None,
+                'args': json.loads(args)
+            }
+
+    def events(self, event_name: Optional[str] = None, game_number: Optional[int] = None,
+               player: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Stored events matching every given filter, in chain order"""
+        return list(self.iter_events(event_name, game_number, player, limit))
+
+    def count(self, event_name: Optional[str] = None, game_number: Optional[int] = None,
+              player: Optional[str] = None) -> int:
+        """Number of stored events matching every given filter"""
+        where, params = self._filters(event_name, game_number, player)
+        return self.db.execute(f"SELECT COUNT(*) FROM events{where}", params).fetchone()[0]
+
+    def ticket_count(self, game_number: int, player: Optional[str] = None) -> int:
+        """Tickets bought in a game, by everyone or by one wallet"""
+        return self.count('TicketPurchased', game_number, player)
+
+    def _filters(self, event_name: Optional[str], game_number: Optional[int], player: Optional[str],
+                 from_block: Optional[int] = None):
+        clauses, params = [], []
+        if event_name is not None:
+            clauses.append("event = ?")
+            params.append(event_name)
+        if game_number is not None:
+            clauses.append("game_number = ?")
+            params.append(game_number)
+        if player is not None:
+            clauses.append("player = ?")
+            params.append(player.lower())
+        if from_block is not None:
+            clauses.append("block_number >= ?")
+            params.append(from_block)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ''), params
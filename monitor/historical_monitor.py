@@ -1,27 +1,61 @@
-# run this with python historical-monitor.py --start-block [START_BLOCK] --end-block [END_BLOCK]
+# run this with python historical-monitor.py --start-block [START_BLOCK] --end-block [END_BLOCK] [--workers N] [--resume]
+#                  [--sink file --output-dir DIR]
 
 import os
 import time
 import argparse
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 from web3 import Web3
 from eth_utils import to_checksum_address
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 from contract_abi import CONTRACT_ABI
+from block_times import BlockTimestamps
+from dedup import DeliveryIndex
+from event_export import EventFileWriter, event_record
+from event_registry import EVENT_REGISTRY
+from event_store import EventStore
+from range_planner import BlockRangePlanner
+from rpc_batch import RpcBatcher, RpcCallError
+from rpc_pool import PooledHTTPProvider, RpcPool, node_urls
+from state_store import BackfillCheckpoint, atomic_write_json, state_path
+from webhook_outbox import WebhookOutbox
+from webhook_queue import WebhookQueue
 
 # Load environment variables
 load_dotenv()
 
 # Constants
 CONTRACT_ADDRESS = '0x043c9ae2764B5a7c2d685bc0262F8cF2f6D86008'
-BATCH_SIZE = 1000  # Number of blocks to process in each batch
+BATCH_SIZE = 1000  # Initial number of blocks per batch, adapted at runtime
+RPC_BATCH_WINDOWS = 4  # Block windows fetched in one batched request
+CHECKPOINT_FILE = 'historical_checkpoint.json'
+EXPORT_CHECKPOINT_FILE = 'historical_export_checkpoint.json'
+SUMMARY_FILE = 'historical_summary.json'
+EXPORT_CHECKPOINT_INTERVAL = 60  # seconds between export checkpoints while no events are found
+
+# Event name -> EventHandler method suffix; the backfill also covers game events the live monitor ignores
+EVENT_TYPES = {
+    'TicketPurchased': 'ticket_purchased',
+    'DrawInitiated': 'draw_initiated',
+    'RandomSet': 'random_set',
+    'VDFProofSubmitted': 'vdf_proof_submitted',
+    'GamePrizePayoutInfo': 'game_prize_payout_info',
+    'WinningNumbersSet': 'winning_numbers_set',
+    'PrizeClaimed': 'prize_claimed',
+    'NFTMinted': 'nft_minted',
+    'DifficultyChanged': 'difficulty_changed',
+    'ExcessPrizePoolTransferred': 'excess_prize_pool_transferred',
+    'TicketPriceChangeScheduled': 'ticket_price_change_scheduled'
+}
+# Every contract event is fetched for the event store and exports; only EVENT_TYPES ones are posted
+EVENT_TOPICS = EVENT_REGISTRY.topics()
 
 # Configure logging
 logging.basicConfig(
@@ -34,57 +68,60 @@ class WebhookManager:
     def __init__(self, tickets_webhook: str, events_webhook: str):
         self.tickets_webhook = tickets_webhook
         self.events_webhook = events_webhook
-        self.session = self._create_session()
-        
-        # Add counters for monitoring
+
+        # Add counters for monitoring; set up first, as the queue starts replaying the outbox right away
         self.webhook_counts = {
             'tickets': 0,
             'events': 0
         }
+        self.queue = WebhookQueue(
+            [tickets_webhook, events_webhook],
+            self._create_session,
+            # Kept apart from the live monitor's outbox so each process replays only its own
+            WebhookOutbox('historical_outbox.db'),
+            on_delivered=self._count_delivery
+        )
 
     def _create_session(self) -> requests.Session:
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
-        )
-        session = requests.Session()
-        session.mount("https://", HTTPAdapter(max_retries=retry_strategy))
-        session.mount("http://", HTTPAdapter(max_retries=retry_strategy))
-        return session
+        return requests.Session()
+
+    def _count_delivery(self, webhook_url: str, embeds: List[Dict[str, Any]]) -> None:
+        # Update counters
+        if webhook_url == self.tickets_webhook:
+            self.webhook_counts['tickets'] += len(embeds)
+        else:
+            self.webhook_counts['events'] += len(embeds)
 
     def send_webhook(self, webhook_url: str, embed: Dict[str, Any]) -> bool:
-        try:
-            payload = {"embeds": [embed]}
-            response = self.session.post(webhook_url, json=payload)
-            response.raise_for_status()
-            
-            # Update counters
-            if webhook_url == self.tickets_webhook:
-                self.webhook_counts['tickets'] += 1
-            else:
-                self.webhook_counts['events'] += 1
-                
-            logger.info(f"Successfully sent webhook: {embed.get('title', 'No title')}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to send webhook: {str(e)}")
-            return False
+        self.queue.put(webhook_url, embed)
+        return True
+
+    def commit(self) -> None:
+        self.queue.commit()
+
+    def flush(self) -> None:
+        self.queue.flush()
 
     def get_stats(self) -> Dict[str, int]:
         return self.webhook_counts
 
+    def restore_stats(self, counts: Dict[str, int]) -> None:
+        """Add the totals of the runs this one resumes; replayed deliveries may already be counted"""
+        for webhook_type, count in counts.items():
+            self.webhook_counts[webhook_type] = self.webhook_counts.get(webhook_type, 0) + count
+
 class EventHandler:
-    def __init__(self, w3: Web3, webhook_manager: WebhookManager):
+    def __init__(self, w3: Web3, webhook_manager: WebhookManager, block_times: Optional[BlockTimestamps] = None):
         self.w3 = w3
         self.webhook_manager = webhook_manager
-        self.event_counts: Dict[str, int] = {
-            'TicketPurchased': 0,
-            'DrawInitiated': 0,
-            'RandomSet': 0,
-            'VDFProofSubmitted': 0,
-            'GamePrizePayoutInfo': 0
-        }
+        self.block_times = block_times
+        self.event_counts: Dict[str, int] = {event_type: 0 for event_type in EVENT_TYPES}
+
+    def block_time(self, block_number: int) -> str:
+        """Embed timestamp: when block_number was mined, or now without a resolver"""
+        if self.block_times is None:
+            return datetime.utcnow().isoformat()
+        return self.block_times.isoformat(block_number)
 
     def get_etherscan_link(self, address: str) -> str:
         return f"[{address[:6]}...{address[-4:]}](https://etherscan.io/address/{address})"
@@ -94,7 +131,6 @@ class EventHandler:
         return f"{eth_amount:.4f} ETH"
 
     def handle_ticket_purchased(self, event: Dict[str, Any]) -> None:
-        self.event_counts['TicketPurchased'] += 1
         player = event['args']['player']
         numbers = event['args']['numbers']
         etherball = event['args']['etherball']
@@ -111,7 +147,8 @@ class EventHandler:
                 {"name": "Transaction", "value": tx_link, "inline": False},
                 {"name": "Game Number", "value": str(game_number), "inline": True},
                 {"name": "Numbers", "value": f"{numbers[0]}-{numbers[1]}-{numbers[2]}-{etherball}", "inline": True}
-            ]
+            ],
+            "timestamp": self.block_time(block_number)
         }
 
         self.webhook_manager.send_webhook(self.webhook_manager.tickets_webhook, embed)
@@ -128,7 +165,7 @@ class EventHandler:
                 {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
                 {"name": "Target Block", "value": str(event['args']['targetSetBlock']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
@@ -145,7 +182,7 @@ class EventHandler:
                 {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
                 {"name": "Random Value", "value": hex(event['args']['random']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
@@ -162,7 +199,7 @@ class EventHandler:
                 {"name": "Submitter", "value": self.get_etherscan_link(event['args']['submitter']), "inline": True},
                 {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
@@ -181,52 +218,208 @@ class EventHandler:
                 {"name": "🥈 Silver Prize", "value": self.format_eth(event['args']['silverPrize']), "inline": True},
                 {"name": "🥉 Bronze Prize", "value": self.format_eth(event['args']['bronzePrize']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
 
+    def handle_winning_numbers_set(self, event: Dict[str, Any]) -> None:
+        args = event['args']
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "🎯 Winning Numbers Set!",
+            "color": 0xe67e22,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "Game Number", "value": str(args['gameNumber']), "inline": True},
+                {"name": "Winning Numbers",
+                 "value": f"{args['number1']}-{args['number2']}-{args['number3']}-{args['etherball']}", "inline": True}
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_prize_claimed(self, event: Dict[str, Any]) -> None:
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "🏆 Prize Claimed!",
+            "color": 0x2ecc71,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "Player", "value": self.get_etherscan_link(event['args']['player']), "inline": True},
+                {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
+                {"name": "Amount", "value": self.format_eth(event['args']['amount']), "inline": True}
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_nft_minted(self, event: Dict[str, Any]) -> None:
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "🖼️ Winner NFT Minted!",
+            "color": 0x1abc9c,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "Winner", "value": self.get_etherscan_link(event['args']['winner']), "inline": True},
+                {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
+                {"name": "Token ID", "value": str(event['args']['tokenId']), "inline": True}
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_difficulty_changed(self, event: Dict[str, Any]) -> None:
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "⚙️ Difficulty Changed",
+            "color": 0x95a5a6,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
+                {"name": "New Difficulty", "value": str(event['args']['newDifficulty']), "inline": True}
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_excess_prize_pool_transferred(self, event: Dict[str, Any]) -> None:
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "💸 Excess Prize Pool Transferred",
+            "color": 0xf1c40f,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "From Game", "value": str(event['args']['fromGame']), "inline": True},
+                {"name": "To Game", "value": str(event['args']['toGame']), "inline": True},
+                {"name": "Amount", "value": self.format_eth(event['args']['amount']), "inline": True}
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_ticket_price_change_scheduled(self, event: Dict[str, Any]) -> None:
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "🏷️ Ticket Price Change Scheduled",
+            "color": 0x95a5a6,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "New Price", "value": self.format_eth(event['args']['newPrice']), "inline": True},
+                {"name": "From Game", "value": str(event['args']['effectiveGameNumber']), "inline": True}
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_event(self, event: Dict[str, Any]) -> None:
+        """Count an event and run its handler"""
+        self.event_counts[event['event']] += 1
+        getattr(self, f"handle_{EVENT_TYPES[event['event']]}")(event)
+
     def get_stats(self) -> Dict[str, int]:
         return self.event_counts
 
 class HistoricalMonitor:
-    def __init__(self, start_block: int, end_block: int):
+    def __init__(self, start_block: int, end_block: int, workers: int = 1, resume: bool = False,
+                 summary_file: Optional[str] = None, sink: str = 'discord', output_dir: Optional[str] = None):
         logger.info("Initializing HistoricalMonitor...")
         
         # Store block range
         self.start_block = start_block
         self.end_block = end_block
+        self.workers = workers
+        # 'discord' posts every event; 'file' only exports them and never touches the webhooks
+        self.sink = sink
+        self.output_dir = output_dir or state_path('exports')
         
         # Load configuration
         self.config = self._load_config()
         
-        # Initialize components
+        # Initialize components; the backfill waits for budget rather than skipping ranges
+        self.rpc_pool = RpcPool(self.config['node_urls'])
         self.w3 = self._initialize_web3()
         self.contract = self._initialize_contract()
-        self.webhook_manager = WebhookManager(
-            self.config['tickets_webhook'],
-            self.config['events_webhook']
-        )
-        self.event_handler = EventHandler(self.w3, self.webhook_manager)
+        self.rpc_batcher = RpcBatcher(self.w3.provider)
+        self.block_times = BlockTimestamps(self.rpc_batcher)
+        self.range_planner = BlockRangePlanner(self.config['node_url'], initial_span=BATCH_SIZE)
+        self.event_store = EventStore()
+        self.summary_path = summary_file or state_path(SUMMARY_FILE)
+
+        self.webhook_manager: Optional[WebhookManager] = None
+        if sink == 'file':
+            self.event_counts: Dict[str, int] = {event_type: 0 for event_type in EVENT_REGISTRY.event_names}
+            checkpoint_file = EXPORT_CHECKPOINT_FILE
+        else:
+            self.webhook_manager = WebhookManager(
+                self.config['tickets_webhook'],
+                self.config['events_webhook']
+            )
+            self.event_handler = EventHandler(self.w3, self.webhook_manager, self.block_times)
+            self.event_counts = self.event_handler.event_counts
+            self.delivery_index = DeliveryIndex()
+            checkpoint_file = CHECKPOINT_FILE
+        self.checkpoint = BackfillCheckpoint(checkpoint_file, CONTRACT_ADDRESS, start_block, end_block)
         
         # Initialize statistics
         self.blocks_processed = 0
         self.start_time = datetime.now()
-
-    def _load_config(self) -> Dict[str, str]:
+        self.previous_elapsed = 0.0  # Seconds spent by the runs this one resumes
+        self.next_block = start_block
+        if resume:
+            self._resume()
+
+    def _resume(self) -> None:
+        """Continue after the last block a previous run of this range committed"""
+        state = self.checkpoint.load()
+        if state is None:
+            logger.info(f"No checkpoint for this range, starting at block {self.start_block}")
+            return
+
+        self.next_block = state['last_block'] + 1
+        self.blocks_processed = state['last_block'] - self.start_block + 1
+        self.previous_elapsed = state.get('elapsed_seconds', 0.0)
+        self.event_counts.update(state.get('events', {}))
+        if self.webhook_manager is not None:
+            self.webhook_manager.restore_stats(state.get('webhooks', {}))
+        logger.info(f"Resuming from block {self.next_block} ({self.blocks_processed} blocks already processed)")
+
+    def _load_config(self) -> Dict[str, Any]:
         config = {
-            'node_url': os.getenv('ETH_NODE_URL'),
+            # ETH_NODE_URLS lists several endpoints for failover; ETH_NODE_URL alone still works
+            'node_urls': node_urls('ETH_NODE_URL'),
             'tickets_webhook': os.getenv('TICKETS_WEBHOOK_URL'),
             'events_webhook': os.getenv('EVENTS_WEBHOOK_URL')
         }
+        required = ['node_urls'] if self.sink == 'file' else list(config)
         
-        if not all(config.values()):
+        if not all(config[key] for key in required):
             raise ValueError("Missing required environment variables")
-            
+
+        # The primary endpoint keys per-provider state such as the block range planner
+        config['node_url'] = config['node_urls'][0]
         return config
 
     def _initialize_web3(self) -> Web3:
-        w3 = Web3(Web3.HTTPProvider(self.config['node_url']))
+        w3 = Web3(PooledHTTPProvider(self.rpc_pool))
         if not w3.is_connected():
             raise ConnectionError("Failed to connect to Ethereum node")
         logger.info("Successfully connected to Ethereum node")
@@ -238,41 +431,44 @@ class HistoricalMonitor:
             abi=CONTRACT_ABI
         )
 
-    def get_events(self, event_name: str, from_block: int, to_block: int) -> List[Dict[str, Any]]:
-        try:
-            event = getattr(self.contract.events, event_name)
-            
-            # Get all logs for the specified block range
-            logs = self.w3.eth.get_logs({
-                'address': self.contract.address,
-                'fromBlock': from_block,
-                'toBlock': to_block
-            })
-            
-            # Process logs
-            processed_events = []
-            for log in logs:
-                try:
-                    # Try to process each log
-                    processed_event = event().process_receipt({
-                        'logs': [log]
-                    })
-                    if processed_event:
-                        processed_events.extend(processed_event)
-                except Exception as e:
-                    # Skip logs that don't match this event
-                    continue
-                    
-            return processed_events
-                
-        except Exception as e:
-            logger.error(f"Error getting {event_name} events: {str(e)}")
-            return []
+    def _log_filter(self, from_block: int, to_block: int) -> Dict[str, Any]:
+        """eth_getLogs filter matching every contract event"""
+        return {
+            'address': self.contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            # A list in the first topic position matches any of the given hashes
+            'topics': [EVENT_TOPICS]
+        }
+
+    def _decode_events(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Decode logs by their topic0"""
+        events = []
+        for log in logs:
+            event = EVENT_REGISTRY.decode(log)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def get_events(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """Every contract event in a block range, from one eth_getLogs per range.
+
+        Errors propagate, so the run stops before the checkpoint moves past
+        a range it couldn't fetch and --resume retries it.
+        """
+        def get_logs(range_start: int, range_end: int) -> List[Dict[str, Any]]:
+            return self.w3.eth.get_logs(self._log_filter(range_start, range_end))
+
+        # Oversized ranges are split and retried rather than dropped
+        return self._decode_events(self.range_planner.fetch(from_block, to_block, get_logs))
+
+    def elapsed_time(self) -> float:
+        return self.previous_elapsed + (datetime.now() - self.start_time).total_seconds()
 
     def print_progress(self, current_block: int) -> None:
         self.blocks_processed = current_block - self.start_block + 1
         progress = (self.blocks_processed / (self.end_block - self.start_block + 1)) * 100
-        elapsed_time = (datetime.now() - self.start_time).total_seconds()
+        elapsed_time = self.elapsed_time()
         blocks_per_second = self.blocks_processed / elapsed_time if elapsed_time > 0 else 0
         
         logger.info(
@@ -281,59 +477,186 @@ class HistoricalMonitor:
             f"Speed: {blocks_per_second:.2f} blocks/s"
         )
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Running totals, as saved in checkpoints and the final summary"""
+        elapsed_time = self.elapsed_time()
+        return {
+            'blocks_processed': self.blocks_processed,
+            'elapsed_seconds': round(elapsed_time, 2),
+            'blocks_per_second': round(self.blocks_processed / elapsed_time, 2) if elapsed_time > 0 else 0,
+            'events': dict(self.event_counts),
+            'webhooks': dict(self.webhook_manager.get_stats()) if self.webhook_manager is not None else {}
+        }
+
     def print_final_stats(self) -> None:
-        elapsed_time = (datetime.now() - self.start_time).total_seconds()
-        event_stats = self.event_handler.get_stats()
-        webhook_stats = self.webhook_manager.get_stats()
+        stats = self.get_stats()
         
         logger.info("\n=== Final Statistics ===")
-        logger.info(f"Total blocks processed: {self.blocks_processed}")
-        logger.info(f"Total time: {elapsed_time:.2f} seconds")
-        logger.info(f"Average speed: {self.blocks_processed / elapsed_time:.2f} blocks/s")
+        logger.info(f"Total blocks processed: {stats['blocks_processed']}")
+        logger.info(f"Total time: {stats['elapsed_seconds']:.2f} seconds")
+        logger.info(f"Average speed: {stats['blocks_per_second']:.2f} blocks/s")
         logger.info("\nEvents found:")
-        for event_type, count in event_stats.items():
+        for event_type, count in stats['events'].items():
             logger.info(f"  {event_type}: {count}")
-        logger.info("\nWebhooks sent:")
-        for webhook_type, count in webhook_stats.items():
-            logger.info(f"  {webhook_type}: {count}")
+        if self.webhook_manager is not None:
+            logger.info("\nWebhooks sent:")
+            for webhook_type, count in stats['webhooks'].items():
+                logger.info(f"  {webhook_type}: {count}")
+
+        atomic_write_json(self.summary_path, {
+            'contract': CONTRACT_ADDRESS,
+            'start_block': self.start_block,
+            'end_block': self.end_block,
+            'finished_at': datetime.utcnow().isoformat(),
+            **stats
+        })
+        logger.info(f"Summary written to {self.summary_path}")
+
+    def get_events_batch(self, windows: List[Tuple[int, int]]) -> List[List[Dict[str, Any]]]:
+        """Events for several block windows, fetched with one batched request"""
+        started = time.monotonic()
+        results = self.rpc_batcher.call([
+            # The batch goes out as raw JSON-RPC, so block numbers are hex-encoded here
+            ('eth_getLogs', [{**self._log_filter(from_block, to_block), 'fromBlock': hex(from_block),
+                              'toBlock': hex(to_block)}])
+            for from_block, to_block in windows
+        ])
+        # One request carried every window, so each is charged its share of the time
+        elapsed = (time.monotonic() - started) / len(windows)
+
+        window_events = []
+        for (from_block, to_block), result in zip(windows, results):
+            if isinstance(result, RpcCallError):
+                # Retried on its own, which also splits a range that was too large
+                window_events.append(self.get_events(from_block, to_block))
+                continue
+            self.range_planner.record_result(to_block - from_block + 1, len(result), elapsed)
+            window_events.append(self._decode_events(result))
+        return window_events
+
+    def _plan_windows(self, from_block: int) -> List[Tuple[int, int]]:
+        """The block windows of the next batched request, starting at from_block"""
+        windows = []
+        while from_block <= self.end_block and len(windows) < RPC_BATCH_WINDOWS:
+            batch_end = self.range_planner.next_window(from_block, self.end_block)
+            windows.append((from_block, batch_end))
+            from_block = batch_end + 1
+        return windows
+
+    def _fetch_windows(self, windows: List[Tuple[int, int]]) -> List[List[Dict[str, Any]]]:
+        """Events of a window group plus, in one more batched request, their blocks' timestamps"""
+        window_events = self.get_events_batch(windows)
+        self.block_times.prefetch(event['blockNumber'] for events in window_events for event in events)
+        return window_events
+
+    def _handle_windows(self, windows: List[Tuple[int, int]], window_events: List[List[Dict[str, Any]]]) -> None:
+        logger.info(f"Processing blocks {windows[0][0]} to {windows[-1][1]}")
+
+        for (from_block, to_block), events in zip(windows, window_events):
+            for event_type, count in Counter(event['event'] for event in events).items():
+                logger.info(f"Found {count} {event_type} events")
+
+            self.event_store.add_many(events)
+            # Logs arrive in chain order, so events are posted in the order they happened
+            for event in events:
+                if event['event'] not in EVENT_TYPES:
+                    continue
+                # Skip anything the live monitor or an earlier replay already posted
+                if self.delivery_index.seen(event):
+                    continue
+                self.event_handler.handle_event(event)
+                self.delivery_index.mark(event)
+
+            # Save the window's notifications before recording them as delivered
+            self.webhook_manager.commit()
+            self.delivery_index.commit()
+            self.print_progress(to_block)
+            # Webhook counts only cover deliveries so far; the rest are replayed from the outbox
+            self.checkpoint.save(to_block, self.get_stats())
+
+    def fetched_windows(self) -> Iterator[Tuple[List[Tuple[int, int]], List[List[Dict[str, Any]]]]]:
+        """Fetch and decode window groups on the worker pool, yielding them in block order.
+
+        Up to `workers` groups are in flight while the oldest one is
+        consumed, so the output is the same as a single-worker run and
+        memory stays bounded however long the range is; every request
+        still spends from the shared RPC budget.
+        """
+        in_flight: deque = deque()
+        next_block = self.next_block
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backfill') as executor:
+            while in_flight or next_block <= self.end_block:
+                while next_block <= self.end_block and len(in_flight) < self.workers:
+                    windows = self._plan_windows(next_block)
+                    next_block = windows[-1][1] + 1
+                    in_flight.append((windows, executor.submit(self._fetch_windows, windows)))
+
+                windows, fetched = in_flight.popleft()
+                yield windows, fetched.result()
+
+    def export_events(self) -> None:
+        """Write every event to rotated files instead of posting it.
+
+        The checkpoint only moves when a file is sealed, so a resumed
+        export picks up exactly where the last complete file ended.
+        Stretches without events seal nothing, so while no file is open
+        the checkpoint is moved over them every EXPORT_CHECKPOINT_INTERVAL.
+        """
+        writer = EventFileWriter(self.output_dir, self.next_block)
+        checkpointed_at = time.monotonic()
+
+        for windows, window_events in self.fetched_windows():
+            for events in window_events:
+                self.event_store.add_many(events)
+                for event in events:
+                    self.event_counts[event['event']] += 1
+                    writer.write(event_record(event, self.block_times.get(event['blockNumber'])))
+
+            last_block = windows[-1][1]
+            self.print_progress(last_block)
+            if (writer.should_rotate() or last_block == self.end_block or
+                    writer.is_empty() and time.monotonic() - checkpointed_at >= EXPORT_CHECKPOINT_INTERVAL):
+                writer.seal(last_block)
+                self.checkpoint.save(last_block, self.get_stats())
+                checkpointed_at = time.monotonic()
 
-    def process_events(self) -> None:
-        current_block = self.start_block
-        
-        while current_block <= self.end_block:
-            batch_end = min(current_block + BATCH_SIZE - 1, self.end_block)
-            logger.info(f"Processing blocks {current_block} to {batch_end}")
-
-            event_types = {
-                'TicketPurchased': 'ticket_purchased',
-                'DrawInitiated': 'draw_initiated',
-                'RandomSet': 'random_set',
-                'VDFProofSubmitted': 'vdf_proof_submitted',
-                'GamePrizePayoutInfo': 'game_prize_payout_info'
-            }
-
-            for event_type, handler_name in event_types.items():
-                events = self.get_events(event_type, current_block, batch_end)
-                if events:
-                    logger.info(f"Found {len(events)} {event_type} events")
-                    handler = getattr(self.event_handler, f"handle_{handler_name}")
-                    for event in events:
-                        handler(event)
-
-            self.print_progress(batch_end)
-            current_block = batch_end + 1
-            time.sleep(1)  # Rate limiting
+        self.print_final_stats()
 
+    def process_events(self) -> None:
+        """Backfill the range into the configured sink"""
+        if self.sink == 'file':
+            self.export_events()
+            return
+
+        for windows, window_events in self.fetched_windows():
+            self._handle_windows(windows, window_events)
+
+        # Wait for queued notifications so the final stats are complete
+        self.webhook_manager.flush()
+        if self.blocks_processed:
+            # Window checkpoints predate the last deliveries; a later resume starts from these totals
+            self.checkpoint.save(self.start_block + self.blocks_processed - 1, self.get_stats())
         self.print_final_stats()
 
 def main():
     parser = argparse.ArgumentParser(description='Process historical lottery events')
     parser.add_argument('--start-block', type=int, required=True, help='Starting block number')
     parser.add_argument('--end-block', type=int, required=True, help='Ending block number')
+    parser.add_argument('--workers', type=int, default=1, help='Block ranges fetched in parallel')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue after the last block an interrupted run of this range finished')
+    parser.add_argument('--sink', choices=['discord', 'file'], default='discord',
+                        help='Post events to Discord, or only export them to gzipped JSONL files')
+    parser.add_argument('--output-dir', help='Directory for --sink file exports (default: exports in STATE_DIR)')
+    parser.add_argument('--summary-file', help=f'Where to write the final statistics as JSON '
+                                               f'(default: {SUMMARY_FILE} in STATE_DIR)')
     args = parser.parse_args()
 
     try:
-        monitor = HistoricalMonitor(args.start_block, args.end_block)
+        monitor = HistoricalMonitor(args.start_block, args.end_block, workers=max(args.workers, 1),
+                                    resume=args.resume, summary_file=args.summary_file,
+                                    sink=args.sink, output_dir=args.output_dir)
         monitor.process_events()
     except Exception as e:
         logger.error(f"Failed to process historical events: {str(e)}", exc_info=True)
@@ -0,0 +1,110 @@
+import json
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional
+
+import websockets
+from websockets.sync.client import connect
+
+logger = logging.getLogger(__name__)
+
+
+def _subscribe_request(log_filter: Dict[str, Any]) -> str:
+    return json.dumps({
+        'jsonrpc': '2.0',
+        'id': 1,
+        'method': 'eth_subscribe',
+        'params': ['logs', log_filter]
+    })
+
+
+def _subscription_id(message: Dict[str, Any]) -> Optional[str]:
+    """The subscription id if message answers our eth_subscribe request"""
+    if message.get('id') != 1:
+        return None
+    if 'error' in message:
+        raise ConnectionError(f"eth_subscribe failed: {message['error']}")
+    return message['result']
+
+
+def _subscription_log(message: Dict[str, Any], subscription_id: str) -> Optional[Dict[str, Any]]:
+    params = message.get('params') or {}
+    if message.get('method') != 'eth_subscription' or params.get('subscription') != subscription_id:
+        return None
+    return params['result']
+
+
+class LogStream:
+    """eth_subscribe("logs") over a WebSocket node connection.
+
+    Logs are returned in raw JSON-RPC form, which EVENT_REGISTRY decodes
+    directly. Logs the node withdraws after a reorg arrive again with
+    "removed": true.
+    """
+
+    def __init__(self, ws_url: str, address: str, topics: List[str]):
+        self.ws_url = ws_url
+        self.filter = {'address': address, 'topics': [topics]}
+        self.connection = None
+        self.subscription_id: Optional[str] = None
+
+    def __enter__(self) -> 'LogStream':
+        self.connection = connect(self.ws_url)
+        self.connection.send(_subscribe_request(self.filter))
+
+        while self.subscription_id is None:
+            self.subscription_id = _subscription_id(json.loads(self.connection.recv(timeout=30)))
+
+        logger.info(f"Subscribed to contract logs (subscription {self.subscription_id})")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        self.subscription_id = None
+
+    def next_log(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to timeout seconds for the next log; None if nothing arrived"""
+        try:
+            message = json.loads(self.connection.recv(timeout=timeout))
+        except TimeoutError:
+            return None
+
+        return _subscription_log(message, self.subscription_id)
+
+
+class AsyncLogStream:
+    """asyncio counterpart of LogStream"""
+
+    def __init__(self, ws_url: str, address: str, topics: List[str]):
+        self.ws_url = ws_url
+        self.filter = {'address': address, 'topics': [topics]}
+        self.connection = None
+        self.subscription_id: Optional[str] = None
+
+    async def __aenter__(self) -> 'AsyncLogStream':
+        self.connection = await websockets.connect(self.ws_url)
+        await self.connection.send(_subscribe_request(self.filter))
+
+        while self.subscription_id is None:
+            message = await asyncio.wait_for(self.connection.recv(), timeout=30)
+            self.subscription_id = _subscription_id(json.loads(message))
+
+        logger.info(f"Subscribed to contract logs (subscription {self.subscription_id})")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+        self.connection = None
+        self.subscription_id = None
+
+    async def next_log(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to timeout seconds for the next log; None if nothing arrived"""
+        try:
+            message = json.loads(await asyncio.wait_for(self.connection.recv(), timeout=timeout))
+        except asyncio.TimeoutError:
+            return None
+
+        return _subscription_log(message, self.subscription_id)
@@ -4,15 +4,30 @@ from datetime import datetime
 import json
 from dotenv import load_dotenv
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from web3 import Web3
+from web3.exceptions import BlockNotFound
 from eth_utils import to_checksum_address
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 from contract_abi import CONTRACT_ABI
+from block_times import BlockTimestamps
+from dedup import DeliveryIndex, event_key
+from event_registry import EVENT_REGISTRY
+from event_store import EventStore
+from log_stream import LogStream
+from prize_counts import PrizeTierCounts
+from range_planner import BlockRangePlanner
+from reorg import ReorgTracker
+from rpc_batch import RpcBatcher, RpcCallError
+from rpc_budget import RpcBudgetExceeded
+from rpc_pool import PooledHTTPProvider, RpcPool, node_urls
+from state_store import BlockCursor
+from ticket_digest import TicketDigest
+from ticket_index import TicketIndex
+from webhook_outbox import WebhookOutbox
+from webhook_queue import WebhookQueue
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +36,39 @@ load_dotenv()
 CONTRACT_ADDRESS = '0x043c9ae2764B5a7c2d685bc0262F8cF2f6D86008'
 BLOCK_TIME = 12  # seconds
 BLOCKS_PER_HOUR = 3600 // BLOCK_TIME
+BLOCKS_PER_BATCH = 60  # Initial log window (~12 minutes of blocks), adapted at runtime
+RPC_BATCH_WINDOWS = 5  # Log windows fetched in one batched request while catching up
+
+# Only process blocks this far behind the head, or up to a block tag ('safe'/'finalized') if set
+CONFIRMATION_DEPTH = int(os.getenv('CONFIRMATION_DEPTH', '3'))
+CONFIRMATION_TAG = os.getenv('CONFIRMATION_TAG', '')
+
+CHECK_INTERVAL = 600  # 10 minutes between range polls
+# Stream logs over this WebSocket endpoint when set; range polling then only fills gaps
+ETH_WS_URL = os.getenv('ETH_WS_URL', '')
+STREAM_RECONNECT_DELAY = 5  # seconds
+RPC_MAX_WAIT = 60  # seconds a call may wait for RPC budget before the check is deferred
+
+# Roll TicketPurchased into one summary per game every this many seconds (0 posts every ticket)
+TICKET_DIGEST_WINDOW = int(os.getenv('TICKET_DIGEST_WINDOW', '0'))
+
+# Hot/cold numbers and most picked combinations listed in the "Most Picked Numbers" embed
+MOST_PICKED_COUNT = 5
+# Winners listed per prize tier before the rest are summarized as "+N more"
+MAX_LISTED_WINNERS = 10
+
+# 'async' runs the asyncio engine in async_monitor.py, anything else the threaded one here
+MONITOR_ENGINE = os.getenv('MONITOR_ENGINE', 'sync')
+
+# Monitored events and the EventHandler method suffix that handles each
+EVENT_HANDLERS = {
+    'TicketPurchased': 'ticket_purchased',
+    'DrawInitiated': 'draw_initiated',
+    'RandomSet': 'random_set',
+    'VDFProofSubmitted': 'vdf_proof_submitted',
+    'GamePrizePayoutInfo': 'game_prize_payout_info',
+    'WinningNumbersSet': 'winning_numbers_set'
+}
 
 # Configure logging
 logging.basicConfig(
@@ -33,60 +81,39 @@ class WebhookManager:
     def __init__(self, tickets_webhook: str, events_webhook: str):
         self.tickets_webhook = tickets_webhook
         self.events_webhook = events_webhook
-        self.session = self._create_session()
+        self.queue = WebhookQueue([tickets_webhook, events_webhook], self._create_session, WebhookOutbox())
 
     def _create_session(self) -> requests.Session:
-        """Create a session with retry mechanism for webhooks"""
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
-        )
-        session = requests.Session()
-        session.mount("https://", HTTPAdapter(max_retries=retry_strategy))
-        session.mount("http://", HTTPAdapter(max_retries=retry_strategy))
-        return session
+        """Create a session for webhooks; rate limits and retries are handled by WebhookQueue"""
+        return requests.Session()
 
     def send_webhook(self, webhook_url: str, embed: Dict[str, Any]) -> bool:
-        """Send webhook with basic retry mechanism"""
-        try:
-            payload = {"embeds": [embed]}
-            response = self.session.post(webhook_url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Successfully sent webhook: {embed.get('title', 'No title')}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to send webhook: {str(e)}")
-            return False
-
-class RateLimiter:
-    def __init__(self, max_requests_per_day: int):
-        self.max_requests_per_day = max_requests_per_day
-        self.request_counter = 0
-        self.request_counter_reset = datetime.now()
-
-    def check_limit(self) -> bool:
-        """Check if we're within our conservative rate limits"""
-        now = datetime.now()
-        
-        if (now - self.request_counter_reset).days >= 1:
-            self.request_counter = 0
-            self.request_counter_reset = now
-            
-        if self.request_counter >= self.max_requests_per_day:
-            wait_time = 24 - (now - self.request_counter_reset).seconds / 3600
-            logger.warning(f"Approaching daily rate limit. Waiting {wait_time:.2f} hours...")
-            return False
+        """Stage a webhook; it is written to the outbox and sent on the next commit()"""
+        self.queue.put(webhook_url, embed)
         return True
 
-    def increment(self) -> None:
-        """Increment the request counter"""
-        self.request_counter += 1
+    def commit(self) -> None:
+        self.queue.commit()
+
+    def flush(self) -> None:
+        self.queue.flush()
 
 class EventHandler:
-    def __init__(self, w3: Web3, webhook_manager: WebhookManager):
+    def __init__(self, w3: Web3, webhook_manager: WebhookManager, ticket_digest: Optional[TicketDigest] = None,
+                 block_times: Optional[BlockTimestamps] = None, ticket_index: Optional[TicketIndex] = None,
+                 prize_counts: Optional[PrizeTierCounts] = None):
         self.w3 = w3
         self.webhook_manager = webhook_manager
+        self.ticket_digest = ticket_digest
+        self.block_times = block_times
+        self.ticket_index = ticket_index
+        self.prize_counts = prize_counts
+
+    def block_time(self, block_number: int) -> str:
+        """Embed timestamp: when block_number was mined, or now without a resolver"""
+        if self.block_times is None:
+            return datetime.utcnow().isoformat()
+        return self.block_times.isoformat(block_number)
 
     def get_etherscan_link(self, address: str) -> str:
         return f"[{address[:6]}...{address[-4:]}](https://etherscan.io/address/{address})"
@@ -95,7 +122,16 @@ class EventHandler:
         eth_amount = self.w3.from_wei(wei_amount, 'ether')
         return f"{eth_amount:.4f} ETH"
 
+    def index_event(self, event: Dict[str, Any]) -> None:
+        """Add a ticket to the ticket index, whether or not it is announced"""
+        if self.ticket_index is not None and event['event'] == 'TicketPurchased':
+            self.ticket_index.add(event)
+
     def handle_ticket_purchased(self, event: Dict[str, Any]) -> None:
+        if self.ticket_digest is not None:
+            self.ticket_digest.add(event)
+            return
+
         player = event['args']['player']
         numbers = event['args']['numbers']
         etherball = event['args']['etherball']
@@ -111,7 +147,61 @@ class EventHandler:
                 {"name": "Transaction", "value": tx_link, "inline": False},
                 {"name": "Game Number", "value": str(game_number), "inline": True},
                 {"name": "Numbers", "value": f"{numbers[0]}-{numbers[1]}-{numbers[2]}-{etherball}", "inline": True}
-            ]
+            ],
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.tickets_webhook, embed)
+
+    def buffers(self, event: Dict[str, Any]) -> bool:
+        """Whether the event is held for a later digest summary instead of being posted right away"""
+        return self.ticket_digest is not None and event['event'] == 'TicketPurchased'
+
+    def discard(self, event: Dict[str, Any]) -> None:
+        """Drop a withdrawn event from the pending digest and the ticket index"""
+        if event['event'] != 'TicketPurchased':
+            return
+        if self.ticket_digest is not None:
+            self.ticket_digest.discard(event)
+        if self.ticket_index is not None:
+            self.ticket_index.discard(event)
+
+    def discard_after(self, block_number: int) -> None:
+        """Drop events above block_number, whose blocks a reorg orphaned, from the digest and the ticket index"""
+        if self.ticket_digest is not None:
+            self.ticket_digest.discard_after(block_number)
+        if self.ticket_index is not None:
+            self.ticket_index.discard_after(block_number)
+
+    def flush_ticket_digest(self, up_to_block: int) -> List[Dict[str, Any]]:
+        """Post summaries for every digest window that is complete at up_to_block; returns the tickets they cover"""
+        if self.ticket_digest is None:
+            return []
+        summarized = []
+        for summary in self.ticket_digest.drain(up_to_block):
+            self.handle_ticket_digest(summary)
+            summarized.extend(summary['events'])
+        return summarized
+
+    def handle_ticket_digest(self, summary: Dict[str, Any]) -> None:
+        top_buyers = "\n".join(
+            f"{self.get_etherscan_link(player)} × {count}" for player, count in summary['top_buyers']
+        )
+        samples = ", ".join(
+            f"{numbers[0]}-{numbers[1]}-{numbers[2]}-{etherball}" for numbers, etherball in summary['samples']
+        )
+
+        embed = {
+            "title": f"🎟️ Ticket Sales Summary - Game #{summary['game_number']}",
+            "color": 0x2ecc71,
+            "fields": [
+                {"name": "Blocks", "value": f"{summary['first_block']} - {summary['last_block']}", "inline": False},
+                {"name": "Tickets", "value": str(summary['tickets']), "inline": True},
+                {"name": "Unique Players", "value": str(summary['unique_players']), "inline": True},
+                {"name": "Top Buyers", "value": top_buyers, "inline": False},
+                {"name": "Sample Numbers", "value": samples, "inline": False}
+            ],
+            "timestamp": self.block_time(summary['last_block'])
         }
 
         self.webhook_manager.send_webhook(self.webhook_manager.tickets_webhook, embed)
@@ -128,11 +218,47 @@ class EventHandler:
                 {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
                 {"name": "Target Block", "value": str(event['args']['targetSetBlock']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
 
+        # Ticket sales for the game are over, so its pick statistics are final
+        if self.ticket_index is not None:
+            self.handle_most_picked(event['args']['gameNumber'], event['blockNumber'])
+
+    def handle_most_picked(self, game_number: int, block_number: int) -> None:
+        game = self.ticket_index.game(game_number)
+        if not len(game):
+            return
+
+        def picks(ranked: List[Tuple[int, int]]) -> str:
+            return ", ".join(f"{number} ({count})" for number, count in ranked) or "-"
+
+        shared_combinations, shared_tickets = game.duplicate_combinations()
+        top_combinations = "\n".join(
+            f"{n1}-{n2}-{n3}-{etherball} × {count}"
+            for (n1, n2, n3, etherball), count in game.most_picked_combinations(3)
+        )
+
+        embed = {
+            "title": f"📊 Most Picked Numbers - Game #{game_number}",
+            "color": 0xe67e22,
+            "fields": [
+                {"name": "Tickets", "value": str(len(game)), "inline": True},
+                {"name": "Unique Players", "value": str(len(game.player_ids)), "inline": True},
+                {"name": "🔥 Hot Numbers", "value": picks(game.hot_numbers(MOST_PICKED_COUNT)), "inline": False},
+                {"name": "🧊 Cold Numbers", "value": picks(game.cold_numbers(MOST_PICKED_COUNT)), "inline": False},
+                {"name": "Top Etherballs", "value": picks(game.hot_etherballs(3)), "inline": False},
+                {"name": "Most Picked Combinations", "value": top_combinations, "inline": False},
+                {"name": "Shared Combinations",
+                 "value": f"{shared_combinations} combinations picked by {shared_tickets} tickets", "inline": False}
+            ],
+            "timestamp": self.block_time(block_number)
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
     def handle_random_set(self, event: Dict[str, Any]) -> None:
         tx_hash = event['transactionHash'].hex()
         tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
@@ -145,7 +271,7 @@ class EventHandler:
                 {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True},
                 {"name": "Random Value", "value": hex(event['args']['random']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
@@ -162,7 +288,7 @@ class EventHandler:
                 {"name": "Submitter", "value": self.get_etherscan_link(event['args']['submitter']), "inline": True},
                 {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
@@ -181,11 +307,95 @@ class EventHandler:
                 {"name": "🥈 Silver Prize", "value": self.format_eth(event['args']['silverPrize']), "inline": True},
                 {"name": "🥉 Bronze Prize", "value": self.format_eth(event['args']['bronzePrize']), "inline": True}
             ],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self.block_time(event['blockNumber'])
         }
         
         self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
 
+    def format_winners(self, players: List[str], tickets: int, contract_tickets: Optional[int] = None) -> str:
+        """Winning wallets of a tier, qualified when the contract counts a different number of tickets"""
+        if contract_tickets is not None and tickets > contract_tickets:
+            # Some indexed tickets aren't on chain, and there is no telling which
+            if contract_tickets == 0:
+                return "No winners"
+            return f"⚠️ The local index has {tickets - contract_tickets} extra tickets, so wallets aren't listed"
+
+        missing = 0 if contract_tickets is None else contract_tickets - tickets
+        if not players:
+            return f"⚠️ {missing} tickets missing from the local index, wallets unknown" if missing else "No winners"
+        listed = "\n".join(self.get_etherscan_link(player) for player in players[:MAX_LISTED_WINNERS])
+        if len(players) > MAX_LISTED_WINNERS:
+            listed += f"\n+{len(players) - MAX_LISTED_WINNERS} more"
+        if missing:
+            listed += f"\n⚠️ Incomplete, {missing} tickets missing from the local index"
+        return listed
+
+    def handle_winning_numbers_set(self, event: Dict[str, Any]) -> None:
+        args = event['args']
+        numbers = [args['number1'], args['number2'], args['number3']]
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        fields = [
+            {"name": "Transaction", "value": tx_link, "inline": False},
+            {"name": "Game Number", "value": str(args['gameNumber']), "inline": True},
+            {"name": "Winning Numbers", "value": f"{numbers[0]}-{numbers[1]}-{numbers[2]}-{args['etherball']}",
+             "inline": True}
+        ]
+
+        # Winners come from the locally indexed tickets rather than per-player contract calls,
+        # checked against the contract's own tier counts, which are what it pays out on
+        if self.ticket_index is not None:
+            winners = self.ticket_index.game(args['gameNumber']).winners(numbers, args['etherball'])
+            contract_counts = None
+            if self.prize_counts is not None:
+                contract_counts = self.prize_counts.get(
+                    args['gameNumber'], {tier: winners[tier]['key'] for tier in winners}
+                )
+            for tier, label in (('gold', '🥇 Gold'), ('silver', '🥈 Silver'), ('bronze', '🥉 Bronze')):
+                tickets = winners[tier]['tickets']
+                contract_tickets = None if contract_counts is None else contract_counts[tier]
+                if contract_tickets is not None and contract_tickets != tickets:
+                    logger.warning(
+                        f"Game {args['gameNumber']} has {contract_tickets} {tier} tickets on chain "
+                        f"but {tickets} in the local index"
+                    )
+                fields.append({
+                    "name": f"{label} Winners ({tickets if contract_tickets is None else contract_tickets} tickets)",
+                    "value": self.format_winners(winners[tier]['players'], tickets, contract_tickets),
+                    "inline": False
+                })
+
+        embed = {
+            "title": "🎯 Winning Numbers Set!",
+            "color": 0xe67e22,
+            "fields": fields,
+            "timestamp": self.block_time(event['blockNumber'])
+        }
+
+        self.webhook_manager.send_webhook(self.webhook_manager.events_webhook, embed)
+
+    def handle_reorg_correction(self, event: Dict[str, Any]) -> None:
+        tx_hash = event['transactionHash'].hex()
+        tx_link = f"[View Transaction](https://etherscan.io/tx/{tx_hash})"
+
+        embed = {
+            "title": "⚠️ Correction: Event Reverted",
+            "description": f"The {event['event']} announced from block {event['blockNumber']} was removed by a chain reorganization.",
+            "color": 0xe74c3c,
+            "fields": [
+                {"name": "Transaction", "value": tx_link, "inline": False},
+                {"name": "Game Number", "value": str(event['args']['gameNumber']), "inline": True}
+            ],
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+        if event['event'] == 'TicketPurchased':
+            webhook_url = self.webhook_manager.tickets_webhook
+        else:
+            webhook_url = self.webhook_manager.events_webhook
+        self.webhook_manager.send_webhook(webhook_url, embed)
+
 class LotteryMonitor:
     def __init__(self):
         logger.info("Initializing LotteryMonitor...")
@@ -194,35 +404,59 @@ class LotteryMonitor:
         self.config = self._load_config()
         
         # Initialize components
+        self.rpc_pool = RpcPool(self.config['node_urls'], max_wait=RPC_MAX_WAIT)
         self.w3 = self._initialize_web3()
         self.contract = self._initialize_contract()
         self.webhook_manager = WebhookManager(
             self.config['tickets_webhook'],
             self.config['events_webhook']
         )
-        self.rate_limiter = RateLimiter(max_requests_per_day=1000)
-        self.event_handler = EventHandler(self.w3, self.webhook_manager)
+        self.rpc_batcher = RpcBatcher(self.w3.provider)
+        self._initialize_processing(
+            BlockTimestamps(self.rpc_batcher), PrizeTierCounts(self.contract, self.rpc_batcher)
+        )
         
         # Initialize state
         self.last_processed_block = self._get_safe_starting_block()
+        self._restore_ticket_digest()
         logger.info(f"Starting from block {self.last_processed_block}")
 
-    def _load_config(self) -> Dict[str, str]:
+    def _initialize_processing(self, block_times: BlockTimestamps, prize_counts: PrizeTierCounts) -> None:
+        """Event handling, dedup, reorg and cursor state; the same for both engines once w3 and webhooks exist"""
+        self.block_times = block_times
+        self.event_store = EventStore()
+        self.event_handler = EventHandler(
+            self.w3, self.webhook_manager, self._create_ticket_digest(), block_times,
+            TicketIndex(self.event_store), prize_counts
+        )
+        self.delivery_index = DeliveryIndex()
+        self.reorg_tracker = ReorgTracker()
+        # Every contract event is fetched for the event store; only EVENT_HANDLERS ones are posted
+        self.event_topics = EVENT_REGISTRY.topics()
+        self.range_planner = BlockRangePlanner(self.config['node_url'], initial_span=BLOCKS_PER_BATCH)
+        self.cursor = BlockCursor('monitor_cursor.json', CONTRACT_ADDRESS)
+        self.orphaned_events: List[Dict[str, Any]] = []
+        self.rescanned_keys: set = set()
+
+    def _load_config(self) -> Dict[str, Any]:
         """Load and validate configuration from environment variables"""
         config = {
-            'node_url': os.getenv('ETH_NODE_URL'),
+            # ETH_NODE_URLS lists several endpoints for failover; ETH_NODE_URL alone still works
+            'node_urls': node_urls('ETH_NODE_URL'),
             'tickets_webhook': os.getenv('TICKETS_WEBHOOK_URL'),
             'events_webhook': os.getenv('EVENTS_WEBHOOK_URL')
         }
         
         if not all(config.values()):
             raise ValueError("Missing required environment variables")
-            
+
+        # The primary endpoint keys per-provider state such as the block range planner
+        config['node_url'] = config['node_urls'][0]
         return config
 
     def _initialize_web3(self) -> Web3:
         """Initialize Web3 connection"""
-        w3 = Web3(Web3.HTTPProvider(self.config['node_url']))
+        w3 = Web3(PooledHTTPProvider(self.rpc_pool))
         if not w3.is_connected():
             raise ConnectionError("Failed to connect to Ethereum node")
         logger.info("Successfully connected to Ethereum node")
@@ -235,8 +469,18 @@ class LotteryMonitor:
             abi=CONTRACT_ABI
         )
 
+    def _create_ticket_digest(self) -> Optional[TicketDigest]:
+        if TICKET_DIGEST_WINDOW <= 0:
+            return None
+        return TicketDigest(window_blocks=max(TICKET_DIGEST_WINDOW // BLOCK_TIME, 1))
+
     def _get_safe_starting_block(self) -> int:
-        """Get a safe starting block number"""
+        """Resume from the saved cursor, or start an hour back on first run"""
+        saved_block = self.cursor.load()
+        if saved_block is not None:
+            logger.info(f"Resuming from saved cursor at block {saved_block}")
+            return saved_block
+
         try:
             current_block = self.w3.eth.block_number
             return max(current_block - BLOCKS_PER_HOUR, 0)
@@ -244,80 +488,287 @@ class LotteryMonitor:
             logger.error(f"Error getting current block: {str(e)}")
             return 0
 
-    def get_events(self, event_name: str, from_block: int, to_block: int) -> List[Dict[str, Any]]:
-        """Get events with rate limiting"""
-        if not self.rate_limiter.check_limit():
-            return []
-            
+    def _get_confirmed_block(self) -> int:
+        """Newest block deep enough to process"""
+        if CONFIRMATION_TAG:
+            return self.w3.eth.get_block(CONFIRMATION_TAG)['number']
+        return max(self.w3.eth.block_number - CONFIRMATION_DEPTH, 0)
+
+    def _get_block_hash(self, block_number: int) -> bytes:
         try:
-            event = getattr(self.contract.events, event_name)
-            event_filter = {
-                'address': self.contract.address,
-                'fromBlock': from_block,
-                'toBlock': to_block
-            }
-            
-            if hasattr(event, 'event_abi'):
-                event_signature_hex = self.w3.keccak(
-                    text=f"{event.event_abi['name']}({','.join([arg['type'] for arg in event.event_abi['inputs']])})"
-                ).hex()
-                event_filter['topics'] = [event_signature_hex]
-            
-            self.rate_limiter.increment()
-            logs = self.w3.eth.get_logs(event_filter)
-            return [event.process_log(log) for log in logs]
-            
-        except Exception as e:
-            logger.error(f"Error getting {event_name} events: {str(e)}")
-            return []
+            return self.w3.eth.get_block(block_number)['hash']
+        except BlockNotFound:
+            # The chain got shorter, so whatever we saw at this height is gone
+            return b''
+
+    def _check_for_reorg(self) -> None:
+        """Rewind the cursor to the fork point if a processed block was orphaned"""
+        fork_block = self.reorg_tracker.find_fork_point(self._get_block_hash)
+        if fork_block is None:
+            return
+
+        self._rewind(fork_block)
+
+    def _rewind(self, fork_block: int) -> None:
+        """Forget everything learned from blocks after fork_block and move the cursor back to fetch them again"""
+        logger.warning(f"Chain reorganization detected, re-fetching from block {fork_block + 1}")
+        self.orphaned_events.extend(self.reorg_tracker.rewind(fork_block))
+        self.event_store.remove_after(fork_block)
+        self.event_handler.discard_after(fork_block)
+        if fork_block < self.last_processed_block:
+            self._commit_block(fork_block)
+
+    def _resolve_orphaned_events(self) -> None:
+        """Post corrections for orphaned events that the canonical chain no longer contains"""
+        pending = []
+        for event in self.orphaned_events:
+            if event['blockNumber'] > self.last_processed_block:
+                pending.append(event)
+            elif event_key(event) not in self.rescanned_keys:
+                logger.warning(f"{event['event']} from block {event['blockNumber']} was removed by a reorg")
+                self.event_handler.handle_reorg_correction(event)
+                # If the transaction is mined again later it should be announced again
+                self.delivery_index.forget(event)
+
+        self.orphaned_events = pending
+        if not pending:
+            self.rescanned_keys.clear()
+        self._commit_deliveries()
+
+    def _commit_deliveries(self) -> None:
+        """Write staged notifications to the outbox, then record them as delivered.
+
+        In this order a crash can at worst repeat a notification, never
+        lose one.
+        """
+        self.webhook_manager.commit()
+        self.delivery_index.commit()
+
+    def _commit_block(self, block_number: int) -> None:
+        """Mark every block up to block_number as processed and persist it"""
+        self._flush_ticket_digest(block_number)
+        self._commit_deliveries()
+        self.last_processed_block = block_number
+        self.cursor.save(block_number)
+
+    def _log_filter(self, from_block: int, to_block: int) -> Dict[str, Any]:
+        """eth_getLogs filter matching every contract event"""
+        return {
+            'address': self.contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            # A list in the first topic position matches any of the given hashes
+            'topics': [self.event_topics]
+        }
+
+    def _get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """Single eth_getLogs call for every contract event"""
+        return self.w3.eth.get_logs(self._log_filter(from_block, to_block))
+
+    def _decode_events(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        events = []
+        for log in logs:
+            event = EVENT_REGISTRY.decode(log)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def get_events(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """Get all contract events in a block range, splitting the range if the provider rejects it"""
+        return self._decode_events(self.range_planner.fetch(from_block, to_block, self._get_logs))
+
+    def get_events_batch(self, windows: List[Tuple[int, int]]) -> List[List[Dict[str, Any]]]:
+        """Events for several block windows, fetched with one batched eth_getLogs request"""
+        started = time.monotonic()
+        results = self.rpc_batcher.call([
+            # The batch goes out as raw JSON-RPC, so block numbers are hex-encoded here
+            ('eth_getLogs', [{**self._log_filter(from_block, to_block), 'fromBlock': hex(from_block),
+                              'toBlock': hex(to_block)}])
+            for from_block, to_block in windows
+        ])
+        # One request carried every window, so each is charged its share of the time
+        elapsed = (time.monotonic() - started) / len(windows)
+
+        window_events = []
+        for (from_block, to_block), result in zip(windows, results):
+            if isinstance(result, RpcCallError):
+                # Retried on its own, which also splits a range that was too large
+                logger.warning(f"Batched getLogs for blocks {from_block}-{to_block} failed ({str(result)}), retrying")
+                window_events.append(self.get_events(from_block, to_block))
+                continue
+            self.range_planner.record_result(to_block - from_block + 1, len(result), elapsed)
+            window_events.append(self._decode_events(result))
+        return window_events
+
+    def dispatch_event(self, event: Dict[str, Any]) -> None:
+        """Run the handler for an event unless it isn't posted or was already delivered"""
+        if event['event'] not in EVENT_HANDLERS:
+            return
+        # The index follows the chain like the event store does, so a re-mined ticket counts again
+        self.event_handler.index_event(event)
+        if self.delivery_index.seen(event):
+            logger.info(f"Skipping already delivered {event['event']} in block {event['blockNumber']}")
+            return
+        handler = getattr(self.event_handler, f"handle_{EVENT_HANDLERS[event['event']]}")
+        handler(event)
+        if self.event_handler.buffers(event):
+            # Marked by _flush_ticket_digest once its summary is staged
+            return
+        self._mark_delivered(event)
+
+    def _mark_delivered(self, event: Dict[str, Any]) -> None:
+        self.delivery_index.mark(event)
+        self.reorg_tracker.record_delivery(event)
+
+    def _flush_ticket_digest(self, up_to_block: int) -> None:
+        """Stage summaries of the digest windows complete at up_to_block and mark their tickets delivered"""
+        for event in self.event_handler.flush_ticket_digest(up_to_block):
+            self._mark_delivered(event)
+
+    def _restore_ticket_digest(self) -> None:
+        """Reload tickets of the digest windows still open at the cursor, which only lived in memory.
+
+        Their blocks are behind the cursor and won't be fetched again, but
+        the event store has them and none were marked delivered yet.
+        """
+        digest = self.event_handler.ticket_digest
+        if digest is None or self.last_processed_block is None:
+            return
+        restored = 0
+        from_block = digest.window_start(self.last_processed_block)
+        for event in self.event_store.iter_events('TicketPurchased', from_block=from_block):
+            if not self.delivery_index.seen(event):
+                digest.add(event)
+                restored += 1
+        if restored:
+            logger.info(f"Restored {restored} undigested tickets from block {from_block}")
 
     def process_events(self) -> None:
         """Process events in batches"""
         try:
-            if not self.rate_limiter.check_limit():
-                logger.info("Rate limit approached, skipping this check")
+            if not self.rpc_pool.has_budget('eth_getLogs'):
+                logger.info("Daily RPC budget exhausted, skipping this check")
                 return
 
-            current_block = self.w3.eth.block_number
-            self.rate_limiter.increment()
+            current_block = self._get_confirmed_block()
+            self._check_for_reorg()
 
             if current_block <= self.last_processed_block:
                 return
 
-            blocks_per_batch = 60  # ~1 minute worth of blocks
             start_block = self.last_processed_block + 1
             
             while start_block <= current_block:
-                end_block = min(start_block + blocks_per_batch - 1, current_block)
-                logger.info(f"Processing blocks {start_block} to {end_block}")
-
-                event_types = {
-                    'TicketPurchased': 'ticket_purchased',
-                    'DrawInitiated': 'draw_initiated',
-                    'RandomSet': 'random_set',
-                    'VDFProofSubmitted': 'vdf_proof_submitted',
-                    'GamePrizePayoutInfo': 'game_prize_payout_info'
-                }
-
-                for event_type, handler_name in event_types.items():
-                    events = self.get_events(event_type, start_block, end_block)
-                    if events:
-                        logger.info(f"Found {len(events)} {event_type} events")
-                        handler = getattr(self.event_handler, f"handle_{handler_name}")
-                        for event in events:
-                            handler(event)
-
-                self.last_processed_block = end_block
-                start_block = end_block + 1
+                # Stop before the windows rather than skip them, so nothing is lost
+                if not self.rpc_pool.has_budget('eth_getLogs'):
+                    logger.info("Daily RPC budget exhausted, resuming next check")
+                    return
+
+                windows = self._next_windows(start_block, current_block, RPC_BATCH_WINDOWS)
+                start_block = windows[-1][1] + 1
+                logger.info(f"Processing blocks {windows[0][0]} to {windows[-1][1]}")
+
+                window_events = self.get_events_batch(windows)
+                # One batched header lookup covers the embed timestamps of every window
+                self.block_times.prefetch(event['blockNumber'] for events in window_events for event in events)
+
+                for (from_block, to_block), events in zip(windows, window_events):
+                    self._handle_window(from_block, to_block, events)
+
                 time.sleep(2)  # Add delay between batches
 
+            self._finish_pass(current_block, self._get_block_hash(current_block))
+
+        except RpcBudgetExceeded as e:
+            logger.warning(f"{str(e)}, resuming next check")
         except Exception as e:
             logger.error(f"Error processing events: {str(e)}", exc_info=True)
 
+    def _next_windows(self, start_block: int, current_block: int, count: int) -> List[Tuple[int, int]]:
+        """Up to count consecutive log windows from start_block, sized by the range planner"""
+        windows = []
+        while start_block <= current_block and len(windows) < count:
+            end_block = self.range_planner.next_window(start_block, current_block)
+            windows.append((start_block, end_block))
+            start_block = end_block + 1
+        return windows
+
+    def _handle_window(self, from_block: int, to_block: int, events: List[Dict[str, Any]]) -> None:
+        """Store, post and commit one fetched window"""
+        if events:
+            logger.info(f"Found {len(events)} events in blocks {from_block} to {to_block}")
+
+        if self.orphaned_events:
+            self.rescanned_keys.update(event_key(event) for event in events)
+
+        self.event_store.add_many(events)
+        # Logs come back in chain order, so handlers see events as they happened
+        for event in events:
+            self.dispatch_event(event)
+
+        self._commit_block(to_block)
+
+    def _finish_pass(self, current_block: int, current_hash: bytes) -> None:
+        # Remember the head we stopped at so a later reorg below it is noticed
+        self.reorg_tracker.record_block(current_block, current_hash)
+        self._resolve_orphaned_events()
+
+    def handle_streamed_log(self, log: Dict[str, Any]) -> None:
+        """Deliver a log pushed by the WebSocket subscription"""
+        event = EVENT_REGISTRY.decode(log)
+        if event is None:
+            return
+
+        if log.get('removed'):
+            # The node withdrew this log in a reorg; correct it if we announced it
+            self.event_store.remove(event)
+            self.event_handler.discard(event)
+            if event['event'] in EVENT_HANDLERS and self.delivery_index.seen(event):
+                logger.warning(f"{event['event']} from block {event['blockNumber']} was removed by a reorg")
+                self.event_handler.handle_reorg_correction(event)
+                self.delivery_index.forget(event)
+                self.reorg_tracker.discard_delivery(event)
+                self._commit_deliveries()
+            return
+
+        self.event_store.add_many([event])
+        self.dispatch_event(event)
+        # Later blocks are arriving, so earlier digest windows are complete
+        self._flush_ticket_digest(event['blockNumber'] - 1)
+        self._commit_deliveries()
+
+    def run_stream(self) -> None:
+        """Stream logs as they are mined, polling ranges to fill gaps and advance the cursor"""
+        logger.info("Starting log streaming loop")
+
+        while True:
+            try:
+                with LogStream(ETH_WS_URL, self.contract.address, self.event_topics) as stream:
+                    # Catch up on anything missed while disconnected
+                    self.process_events()
+                    last_poll = time.time()
+
+                    while True:
+                        timeout = max(CHECK_INTERVAL - (time.time() - last_poll), 0)
+                        log = stream.next_log(timeout=timeout)
+                        if log is not None:
+                            self.handle_streamed_log(log)
+
+                        if time.time() - last_poll >= CHECK_INTERVAL:
+                            self.process_events()
+                            last_poll = time.time()
+
+            except Exception as e:
+                logger.error(f"Log stream interrupted: {str(e)}. Reconnecting in {STREAM_RECONNECT_DELAY}s")
+                time.sleep(STREAM_RECONNECT_DELAY)
+
     def run(self) -> None:
         """Main monitoring loop"""
+        if ETH_WS_URL:
+            self.run_stream()
+            return
+
         logger.info("Starting main monitoring loop")
-        check_interval = 600  # 10 minutes
         
         while True:
             try:
@@ -325,18 +776,22 @@ class LotteryMonitor:
                 self.process_events()
                 
                 elapsed = time.time() - start_time
-                sleep_time = max(check_interval - elapsed, 0)
+                sleep_time = max(CHECK_INTERVAL - elapsed, 0)
                 
                 logger.info(f"Processed events. Next check in {sleep_time/60:.1f} minutes")
                 time.sleep(sleep_time)
                 
             except Exception as e:
                 logger.error(f"Error in main loop: {str(e)}", exc_info=True)
-                time.sleep(check_interval)
+                time.sleep(CHECK_INTERVAL)
 
 def main():
     try:
-        monitor = LotteryMonitor()
+        if MONITOR_ENGINE == 'async':
+            from async_monitor import AsyncLotteryMonitor
+            monitor = AsyncLotteryMonitor()
+        else:
+            monitor = LotteryMonitor()
         monitor.run()
     except Exception as e:
         logger.error(f"Failed to start monitor: {str(e)}", exc_info=True)
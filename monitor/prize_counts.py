@@ -0,0 +1,56 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from rpc_batch import RpcBatcher, RpcCallError
+from ticket_index import PRIZE_TIERS
+
+logger = logging.getLogger(__name__)
+
+
+class PrizeTierCounts:
+    """The contract's own gold/silver/bronzeTicketCounts for a game's winning numbers.
+
+    Winners are found in the local TicketIndex, which misses tickets it
+    never saw; these counts are what the contract pays out on, so embeds
+    are checked against them. Sync lookups are one batched request of
+    three eth_calls; the async engine reads them on the event loop and
+    store()s them before dispatching the window.
+    """
+
+    def __init__(self, contract: Any, batcher: Optional[RpcBatcher] = None):
+        self.contract = contract
+        self.batcher = batcher
+        # (game number, gold key) -> tickets per tier
+        self.counts: Dict[Tuple[int, bytes], Dict[str, int]] = {}
+
+    def cached(self, game_number: int, keys: Dict[str, bytes]) -> Optional[Dict[str, int]]:
+        return self.counts.get((game_number, keys['gold']))
+
+    def store(self, game_number: int, keys: Dict[str, bytes], counts: Dict[str, int]) -> None:
+        self.counts[(game_number, keys['gold'])] = counts
+
+    def fetch(self, game_number: int, keys: Dict[str, bytes]) -> Optional[Dict[str, int]]:
+        """Read every tier's count in one batched request; None if any call failed"""
+        calls = [
+            ('eth_call', [{
+                'to': self.contract.address,
+                'data': self.contract.encode_abi(f"{tier}TicketCounts", args=[game_number, keys[tier]])
+            }, 'latest'])
+            for tier in PRIZE_TIERS
+        ]
+        results = self.batcher.call(calls)
+        for result in results:
+            if isinstance(result, RpcCallError) or not result:
+                logger.warning(f"Could not read the prize tier counts of game {game_number}: {result}")
+                return None
+
+        counts = {tier: int(result, 16) for tier, result in zip(PRIZE_TIERS, results)}
+        self.store(game_number, keys, counts)
+        return counts
+
+    def get(self, game_number: int, keys: Dict[str, bytes]) -> Optional[Dict[str, int]]:
+        """Tickets per tier as the contract counts them, or None if they can't be read"""
+        counts = self.cached(game_number, keys)
+        if counts is None and self.batcher is not None:
+            counts = self.fetch(game_number, keys)
+        return counts
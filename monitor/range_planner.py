@@ -0,0 +1,166 @@
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Callable, Awaitable, Iterator, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from state_store import state_path, atomic_write_json, load_json
+
+logger = logging.getLogger(__name__)
+
+# Fragments of the errors providers return when an eth_getLogs range is too large. Generic
+# "limit exceeded" wording and code -32005 are left out: providers use them for rate limits too.
+OVERFLOW_ERROR_MARKERS = (
+    'query returned more than',
+    'query exceeds max results',
+    'response size exceeded',
+    'response size is larger',
+    'exceed maximum block range',
+    'exceeds max block range',
+    'block range limit exceeded',
+    'block range is too large',
+    'block range is too wide',
+    'block range too large',
+    'range is too large',
+    'too many results',
+    'timed out',
+    'timeout'
+)
+
+
+def is_overflow_error(error: Exception) -> bool:
+    """Whether an error means the block range should be split and retried"""
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError, asyncio.TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in OVERFLOW_ERROR_MARKERS)
+
+
+class BlockRangePlanner:
+    """Sizes eth_getLogs block windows from provider feedback.
+
+    The window grows while responses stay small and fast, halves when a
+    response is too large, too slow or rejected, and the size that works
+    is remembered per provider across restarts.
+    """
+
+    def __init__(self, node_url: str, initial_span: int, min_span: int = 1, max_span: int = 10000,
+                 target_results: int = 1000, slow_seconds: float = 10.0,
+                 state_file: str = 'range_planner.json'):
+        self.provider_key = urlparse(node_url).hostname or node_url
+        self.min_span = min_span
+        self.max_span = max_span
+        self.target_results = target_results
+        self.slow_seconds = slow_seconds
+        self.state_file = state_path(state_file)
+
+        remembered = load_json(self.state_file, {}).get(self.provider_key)
+        self.span = self._clamp(remembered or initial_span)
+        logger.info(f"Using {self.span}-block log windows for {self.provider_key}")
+
+    def _clamp(self, span: int) -> int:
+        return max(self.min_span, min(int(span), self.max_span))
+
+    def _set_span(self, span: int) -> None:
+        span = self._clamp(span)
+        if span == self.span:
+            return
+        self.span = span
+        try:
+            state = load_json(self.state_file, {})
+            state[self.provider_key] = span
+            atomic_write_json(self.state_file, state)
+        except OSError as e:
+            logger.warning(f"Could not save block window size: {str(e)}")
+
+    def next_window(self, start_block: int, end_block: int) -> int:
+        """Last block of the next window starting at start_block"""
+        return min(start_block + self.span - 1, end_block)
+
+    def record_result(self, span: int, result_count: int, elapsed: float) -> None:
+        """Adapt the window size after a successful fetch of span blocks"""
+        if result_count > self.target_results or elapsed > self.slow_seconds:
+            self._set_span(span // 2)
+        elif (span >= self.span and result_count <= self.target_results // 4
+              and elapsed <= self.slow_seconds / 2):
+            self._set_span(self.span * 2)
+
+    def record_failure(self, span: int) -> None:
+        """Halve the window size after a fetch of span blocks was too large.
+
+        A shorter window, such as the tail of a range, failing says nothing
+        about the learned size, so only full-size failures shrink it.
+        """
+        if span >= self.span:
+            self._set_span(span // 2)
+
+    def fetch(self, from_block: int, to_block: int,
+              fetch_fn: Callable[[int, int], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Fetch a block range, halving and retrying sub-ranges the provider rejects.
+
+        Errors that don't indicate an oversized range are raised so the
+        caller never mistakes a failed fetch for an empty range.
+        """
+        split = RangeSplit(self, from_block, to_block)
+        for start, stop in split:
+            started = time.monotonic()
+            try:
+                chunk = fetch_fn(start, stop)
+            except Exception as e:
+                split.failed(e)
+                continue
+            split.fetched(chunk, time.monotonic() - started)
+        return split.results
+
+    async def fetch_async(self, from_block: int, to_block: int,
+                          fetch_fn: Callable[[int, int], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """fetch() for a coroutine fetch_fn"""
+        split = RangeSplit(self, from_block, to_block)
+        for start, stop in split:
+            started = time.monotonic()
+            try:
+                chunk = await fetch_fn(start, stop)
+            except Exception as e:
+                split.failed(e)
+                continue
+            split.fetched(chunk, time.monotonic() - started)
+        return split.results
+
+
+class RangeSplit:
+    """One fetch of a block range as sub-ranges, shared by fetch() and fetch_async().
+
+    Iterating yields the next (start, stop) to fetch; the caller reports
+    each one back with fetched() or failed(), which halves the sub-range
+    on an oversized-range error and re-raises anything else.
+    """
+
+    def __init__(self, planner: BlockRangePlanner, from_block: int, to_block: int):
+        self.planner = planner
+        self.to_block = to_block
+        self.start = from_block
+        self.sub_span = to_block - from_block + 1
+        self.results: List[Dict[str, Any]] = []
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        while self.start <= self.to_block:
+            yield self.start, self.stop
+
+    @property
+    def stop(self) -> int:
+        return min(self.start + self.sub_span - 1, self.to_block)
+
+    def fetched(self, chunk: List[Dict[str, Any]], elapsed: float) -> None:
+        self.planner.record_result(self.stop - self.start + 1, len(chunk), elapsed)
+        self.results.extend(chunk)
+        self.start = self.stop + 1
+
+    def failed(self, error: Exception) -> None:
+        start, stop = self.start, self.stop
+        if stop == start or not is_overflow_error(error):
+            raise error
+        self.planner.record_failure(stop - start + 1)
+        self.sub_span = max((stop - start + 1) // 2, 1)
+        logger.warning(f"Range {start}-{stop} too large ({str(error)}), retrying with {self.sub_span} blocks")
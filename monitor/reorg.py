@@ -0,0 +1,96 @@
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Awaitable, Generator, Optional
+
+from hexbytes import HexBytes
+
+logger = logging.getLogger(__name__)
+
+
+class ReorgTracker:
+    """Short in-memory window of recent block hashes and the events posted from them.
+
+    The hash of every processed head and of every block we delivered events
+    from is remembered. If one of them is no longer canonical, the chain
+    reorganized under us and the blocks after the fork point must be
+    fetched again.
+    """
+
+    def __init__(self, max_blocks: int = 128):
+        self.max_blocks = max_blocks
+        self.block_hashes: 'OrderedDict[int, bytes]' = OrderedDict()
+        self.deliveries: Dict[int, List[Dict[str, Any]]] = {}
+
+    def record_block(self, block_number: int, block_hash: bytes) -> None:
+        self.block_hashes[block_number] = bytes(HexBytes(block_hash))
+        # Keep the newest blocks in ascending order
+        self.block_hashes = OrderedDict(sorted(self.block_hashes.items()))
+        while len(self.block_hashes) > self.max_blocks:
+            oldest, _ = self.block_hashes.popitem(last=False)
+            self.deliveries.pop(oldest, None)
+
+    def record_delivery(self, event: Dict[str, Any]) -> None:
+        """Remember a posted event so it can be corrected if its block is orphaned"""
+        if event.get('blockHash') is None:
+            # Read back from a store written before block hashes were kept; nothing to check it against
+            return
+        self.record_block(event['blockNumber'], event['blockHash'])
+        if event['blockNumber'] in self.block_hashes:
+            self.deliveries.setdefault(event['blockNumber'], []).append(event)
+
+    def _fork_search(self) -> Generator[int, bytes, Optional[int]]:
+        """The fork point search, shared by both find_fork_point flavours.
+
+        Yields each remembered block number, newest first, and is sent its
+        canonical hash in return; the generator's return value is the result.
+        """
+        for position, block_number in enumerate(reversed(self.block_hashes)):
+            canonical_hash = yield block_number
+            if bytes(HexBytes(canonical_hash)) == self.block_hashes[block_number]:
+                return None if position == 0 else block_number
+
+        if not self.block_hashes:
+            return None
+        return next(iter(self.block_hashes)) - 1
+
+    def find_fork_point(self, get_block_hash: Callable[[int], bytes]) -> Optional[int]:
+        """Return None if the newest remembered block is still canonical,
+        otherwise the highest remembered block that still is (or the block
+        before the window if the reorg is deeper than what we remember).
+        """
+        search = self._fork_search()
+        try:
+            block_number = next(search)
+            while True:
+                block_number = search.send(get_block_hash(block_number))
+        except StopIteration as done:
+            return done.value
+
+    async def find_fork_point_async(self, get_block_hash: Callable[[int], Awaitable[bytes]]) -> Optional[int]:
+        """find_fork_point() for a coroutine get_block_hash"""
+        search = self._fork_search()
+        try:
+            block_number = next(search)
+            while True:
+                block_number = search.send(await get_block_hash(block_number))
+        except StopIteration as done:
+            return done.value
+
+    def rewind(self, fork_block: int) -> List[Dict[str, Any]]:
+        """Forget everything after fork_block and return the events posted from those blocks"""
+        orphaned = []
+        for block_number in [number for number in self.block_hashes if number > fork_block]:
+            del self.block_hashes[block_number]
+            orphaned.extend(self.deliveries.pop(block_number, []))
+        return orphaned
+
+    def discard_delivery(self, event: Dict[str, Any]) -> None:
+        """Stop tracking a posted event that has already been corrected"""
+        if event['blockNumber'] not in self.deliveries:
+            return
+        key = (bytes(event['transactionHash']), event['logIndex'])
+        posted = self.deliveries[event['blockNumber']]
+        self.deliveries[event['blockNumber']] = [
+            delivered for delivered in posted
+            if (bytes(delivered['transactionHash']), delivered['logIndex']) != key
+        ]
@@ -0,0 +1,94 @@
+import json
+import logging
+from typing import List, Dict, Any, Tuple
+
+from rpc_pool import PooledHTTPProvider
+
+logger = logging.getLogger(__name__)
+
+# Most providers cap batches somewhere between 10 and 1000 calls
+MAX_BATCH_CALLS = 20
+MAX_BATCH_BYTES = 256 * 1024
+
+
+class RpcCallError(Exception):
+    """A JSON-RPC error for one call of a batch"""
+
+    def __init__(self, code: int, message: str):
+        # Keep the code in the text so logs show which limit a provider hit
+        super().__init__(f"{message} (code {code})")
+        self.code = code
+
+
+class RpcBatcher:
+    """Packs JSON-RPC calls into batched HTTP requests on a PooledHTTPProvider.
+
+    call() returns one entry per call, in order: the raw JSON-RPC result,
+    or an RpcCallError when that call failed, so one bad call doesn't
+    sink the rest. Batches are split by call count and body size; a batch
+    the provider rejects as a whole is halved and retried, down to single
+    calls, and later batches stay within the size that worked.
+    """
+
+    def __init__(self, provider: PooledHTTPProvider, max_calls: int = MAX_BATCH_CALLS,
+                 max_bytes: int = MAX_BATCH_BYTES):
+        self.provider = provider
+        self.max_calls = max_calls
+        self.max_bytes = max_bytes
+
+    def _chunks(self, requests: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        chunks: List[List[Dict[str, Any]]] = [[]]
+        size = 0
+        for request in requests:
+            request_size = len(json.dumps(request))
+            if chunks[-1] and (len(chunks[-1]) >= self.max_calls or size + request_size > self.max_bytes):
+                chunks.append([])
+                size = 0
+            chunks[-1].append(request)
+            size += request_size
+        return chunks
+
+    def _send(self, batch: List[Dict[str, Any]], results: List[Any]) -> None:
+        body = self.provider.make_batch(batch)
+
+        if not isinstance(body, list):
+            # The provider refused the batch itself, often for its size
+            error = (body or {}).get('error') or {'code': -32600, 'message': 'invalid batch response'}
+            if len(batch) == 1:
+                results[batch[0]['id']] = RpcCallError(error.get('code', -32600), error.get('message', ''))
+                return
+            logger.warning(f"Provider rejected a batch of {len(batch)} calls ({error.get('message')}), splitting it")
+            middle = len(batch) // 2
+            # Later batches start at a size the provider has a chance of accepting
+            self.max_calls = min(self.max_calls, middle)
+            self._send(batch[:middle], results)
+            self._send(batch[middle:], results)
+            return
+
+        answered = set()
+        for response in body:
+            request_id = response.get('id')
+            if not isinstance(request_id, int) or not 0 <= request_id < len(results):
+                continue
+            answered.add(request_id)
+            if 'error' in response:
+                error = response['error'] or {}
+                results[request_id] = RpcCallError(error.get('code', -32603), error.get('message', ''))
+            else:
+                results[request_id] = response.get('result')
+
+        for request in batch:
+            if request['id'] not in answered:
+                results[request['id']] = RpcCallError(-32603, 'missing from batch response')
+
+    def call(self, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        """Run (method, params) calls in as few HTTP requests as the limits allow"""
+        results: List[Any] = [None] * len(calls)
+        requests = [
+            {'jsonrpc': '2.0', 'id': index, 'method': method, 'params': params}
+            for index, (method, params) in enumerate(calls)
+        ]
+        for batch in self._chunks(requests):
+            if batch:
+                self._send(batch, results)
+        return results
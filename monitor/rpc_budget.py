@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from state_store import state_path
+
+logger = logging.getLogger(__name__)
+
+# Provider compute units per call; anything unlisted costs DEFAULT_METHOD_COST
+METHOD_COSTS = {
+    'eth_chainId': 0,
+    'net_version': 0,
+    'eth_blockNumber': 10,
+    'eth_getBlockByNumber': 16,
+    'eth_getBlockByHash': 16,
+    'eth_call': 26,
+    'eth_getLogs': 75,
+}
+DEFAULT_METHOD_COST = 20
+
+SECONDS_PER_DAY = 86400
+
+
+def method_cost(method: str) -> float:
+    return METHOD_COSTS.get(method, DEFAULT_METHOD_COST)
+
+
+class RpcBudgetExceeded(Exception):
+    """Raised when a call would have to wait longer than the caller allows for budget"""
+
+
+class RpcBudget:
+    """Per-second and per-day token buckets for one node provider, shared between processes.
+
+    Bucket levels live in a SQLite file and are refilled lazily inside an
+    IMMEDIATE transaction, so the live monitor, the historical backfill
+    and the status bots all spend from the same quota. Calls are weighted
+    by METHOD_COSTS, so an eth_getLogs drains the bucket faster than an
+    eth_call, as it does at the provider.
+    """
+
+    def __init__(self, name: str, per_second: float, per_day: float,
+                 filename: Optional[str] = None, max_wait: Optional[float] = None):
+        self.name = name
+        self.max_wait = max_wait
+        # (bucket name, refill rate per second, capacity); a limit of 0 disables that bucket
+        self.buckets = [
+            (f"{name}:second", per_second, per_second),
+            (f"{name}:day", per_day / SECONDS_PER_DAY, per_day),
+        ]
+        self.buckets = [bucket for bucket in self.buckets if bucket[2] > 0]
+
+        path = filename or state_path('rpc_budget.db')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _levels(self, now: float):
+        """Current (name, rate, capacity, tokens) of each bucket; call inside a transaction"""
+        levels = []
+        for name, rate, capacity in self.buckets:
+            row = self.db.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(now - row[1], 0) * rate)
+            levels.append((name, rate, capacity, tokens))
+        return levels
+
+    def reserve(self, cost: float) -> float:
+        """Take cost tokens from every bucket if they all have it and return 0; otherwise return the wait"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels = self._levels(now)
+                wait = 0.0
+                for _, rate, capacity, tokens in levels:
+                    # A call dearer than a whole bucket would never fit; let it through once the bucket is full
+                    needed = min(cost, capacity)
+                    if tokens < needed:
+                        wait = max(wait, (needed - tokens) / rate)
+
+                if wait == 0:
+                    for name, _, capacity, tokens in levels:
+                        # Charged in full, so an oversized call leaves the bucket in debt until it refills
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                            (name, tokens - cost, now)
+                        )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return wait
+
+    def has_budget(self, method: str) -> bool:
+        """Whether the daily quota still covers a call to method, without spending anything.
+
+        The per-second bucket only paces calls and acquire() waits it out,
+        so a momentarily empty one doesn't count as exhausted here.
+        """
+        cost = method_cost(method)
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                levels = self._levels(time.time())
+            finally:
+                self.db.execute("COMMIT")
+        return all(
+            tokens >= min(cost, capacity)
+            for name, _, capacity, tokens in levels if name.endswith(':day')
+        )
+
+    def try_acquire(self, method: str) -> bool:
+        """Spend for a call to method only if the budget covers it right now"""
+        return self.reserve(method_cost(method)) == 0
+
+    def _check_wait(self, method: str, wait: float) -> None:
+        if self.max_wait is not None and wait > self.max_wait:
+            raise RpcBudgetExceeded(f"RPC budget for {self.name} exhausted, {method} would wait {wait:.0f}s")
+        if wait > 60:
+            logger.warning(f"RPC budget for {self.name} exhausted, waiting {wait:.0f}s for {method}")
+
+    def acquire(self, method: str) -> None:
+        """Block until the budget covers a call to method, then spend it"""
+        self._acquire(method_cost(method), method)
+
+    def acquire_batch(self, methods: List[str]) -> None:
+        """acquire() for every call in a JSON-RPC batch at once"""
+        self._acquire(sum(method_cost(method) for method in methods), f"a batch of {len(methods)} calls")
+
+    def _acquire(self, cost: float, label: str) -> None:
+        while True:
+            wait = self.reserve(cost)
+            if wait == 0:
+                return
+            self._check_wait(label, wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, method: str) -> None:
+        """acquire() for the event loop"""
+        cost = method_cost(method)
+        while True:
+            # reserve() may wait up to 30s on another process's write lock, so keep it off the loop
+            wait = await asyncio.to_thread(self.reserve, cost)
+            if wait == 0:
+                return
+            self._check_wait(method, wait)
+            await asyncio.sleep(wait)
+
+
+def budget_for(node_url: str, max_wait: Optional[float] = None) -> RpcBudget:
+    """The shared budget for a node provider, keyed by hostname so every process agrees on it.
+
+    Limits are read from the environment when called, after the entry
+    point has loaded its .env file.
+    """
+    return RpcBudget(
+        urlparse(node_url).hostname or node_url,
+        float(os.getenv('RPC_BUDGET_PER_SECOND', '330')),
+        float(os.getenv('RPC_BUDGET_PER_DAY', '1000000')),
+        filename=os.getenv('RPC_BUDGET_FILE') or None,
+        max_wait=max_wait
+    )
+
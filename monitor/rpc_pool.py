@@ -0,0 +1,353 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, AsyncHTTPProvider
+
+from rpc_budget import RpcBudget, RpcBudgetExceeded, budget_for
+
+logger = logging.getLogger(__name__)
+
+RPC_TIMEOUT = 10  # seconds before an endpoint is abandoned for the next one
+HEALTH_WINDOW = 300  # seconds of history behind latency percentiles and error rates
+HEALTH_SAMPLES = 200  # most recent calls kept per endpoint
+ERROR_PENALTY = 4  # a 25% error rate doubles an endpoint's effective latency
+MAX_COOLDOWN = 60  # seconds
+
+# Read-only calls on the hot path that may be sent to a second endpoint
+HEDGE_METHODS = {'eth_blockNumber', 'eth_call', 'eth_getBlockByNumber', 'eth_chainId'}
+HEDGE_DEFAULT_DELAY = 0.5  # seconds, until an endpoint has latency history
+HEDGE_MIN_DELAY = 0.05  # seconds
+
+# Keep-alive connection pool per endpoint
+POOL_CONNECTIONS = 8
+KEEPALIVE_TIMEOUT = 30  # seconds an idle async connection stays open
+
+SYNC_FAILURES = (requests.RequestException, ValueError)
+ASYNC_FAILURES = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+def node_urls(env_name: str) -> List[str]:
+    """Endpoints for a network: comma-separated <env_name>S if set, otherwise <env_name>"""
+    urls = os.getenv(f"{env_name}S") or os.getenv(env_name) or ''
+    return [url.strip() for url in urls.split(',') if url.strip()]
+
+
+class EndpointHealth:
+    """Recent latencies and failures of one endpoint.
+
+    Only calls within HEALTH_WINDOW count, so an endpoint that was
+    sidelined for errors loses its history and gets probed again.
+    """
+
+    def __init__(self):
+        # (finished at, latency in seconds or None for a failure)
+        self.samples: deque = deque(maxlen=HEALTH_SAMPLES)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency: float, now: float) -> None:
+        self.samples.append((now, latency))
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self, now: float) -> None:
+        self.samples.append((now, None))
+        self.consecutive_failures += 1
+        self.cooldown_until = now + min(2 ** self.consecutive_failures, MAX_COOLDOWN)
+
+    def _recent(self, now: float) -> list:
+        return [latency for finished, latency in self.samples if now - finished <= HEALTH_WINDOW]
+
+    def error_rate(self, now: float) -> float:
+        recent = self._recent(now)
+        if not recent:
+            return 0.0
+        return sum(1 for latency in recent if latency is None) / len(recent)
+
+    def percentile(self, p: float, now: float) -> Optional[float]:
+        """p-th percentile latency of recent successful calls, or None without data"""
+        latencies = sorted(latency for latency in self._recent(now) if latency is not None)
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)]
+
+    def score(self, now: float) -> Tuple[int, float]:
+        """Sort key, lower is healthier: cooling-down endpoints last, then by error-weighted median latency"""
+        if now < self.cooldown_until:
+            return 1, self.cooldown_until
+        median = self.percentile(50, now)
+        if median is None:
+            # Unknown endpoints are tried first so they get measured
+            return 0, 0.0
+        return 0, median * (1 + ERROR_PENALTY * self.error_rate(now))
+
+
+class RpcEndpoint:
+    def __init__(self, url: str, budget: RpcBudget):
+        self.url = url
+        self.name = urlparse(url).hostname or url
+        self.budget = budget
+        self.health = EndpointHealth()
+
+
+class RpcPool:
+    """Node endpoints for one network, ranked by health.
+
+    Each endpoint spends from its own provider's RPC budget. Calls go to
+    the healthiest endpoint and fail over down the ranking when it errors
+    or times out; failing endpoints cool down with exponential backoff.
+
+    With RPC_HEDGE=true, small read-only calls are hedged: if the primary
+    hasn't answered within its p95 latency, the same request goes to the
+    next healthy endpoint that has budget to spare, and the first answer
+    wins.
+    """
+
+    def __init__(self, urls: List[str], max_wait: Optional[float] = None):
+        if not urls:
+            raise ValueError("No RPC endpoints configured")
+        self.endpoints = [RpcEndpoint(url, budget_for(url, max_wait=max_wait)) for url in urls]
+        # Read here rather than at import so the entry point's .env is loaded
+        self.hedge = os.getenv('RPC_HEDGE', 'false').lower() == 'true'
+
+    def ranked(self) -> List[RpcEndpoint]:
+        now = time.time()
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.health.score(now))
+
+    def has_budget(self, method: str) -> bool:
+        """Whether any endpoint's daily quota still covers a call to method"""
+        return any(endpoint.budget.has_budget(method) for endpoint in self.endpoints)
+
+    def should_hedge(self, method: str) -> bool:
+        return self.hedge and method in HEDGE_METHODS and len(self.endpoints) > 1
+
+    def hedge_delay(self, endpoint: RpcEndpoint) -> float:
+        """How long to wait for endpoint before hedging: its recent p95 latency"""
+        p95 = endpoint.health.percentile(95, time.time())
+        return max(HEDGE_DEFAULT_DELAY if p95 is None else p95, HEDGE_MIN_DELAY)
+
+    def hedge_endpoint(self, candidates: List[RpcEndpoint], method: str) -> Optional[RpcEndpoint]:
+        """First healthy candidate whose budget has room for a hedge right now, with the budget spent"""
+        now = time.time()
+        for endpoint in candidates:
+            cooling_down, _ = endpoint.health.score(now)
+            if not cooling_down and endpoint.budget.try_acquire(method):
+                return endpoint
+        return None
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider that spreads requests over an RpcPool with automatic failover"""
+
+    def __init__(self, pool: RpcPool):
+        super().__init__(pool.endpoints[0].url)
+        self.pool = pool
+        self.sessions = {endpoint.url: self._create_session() for endpoint in pool.endpoints}
+        self.transports = {
+            endpoint.url: HTTPProvider(
+                endpoint.url,
+                request_kwargs={'timeout': RPC_TIMEOUT},
+                session=self.sessions[endpoint.url],
+                # Failing over beats retrying the same endpoint
+                exception_retry_configuration=None
+            )
+            for endpoint in pool.endpoints
+        }
+        # Runs the racing requests of hedged calls
+        self.executor = ThreadPoolExecutor(max_workers=POOL_CONNECTIONS, thread_name_prefix='rpc-hedge')
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_CONNECTIONS, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _send(self, endpoint: RpcEndpoint, method, params):
+        """One request to endpoint, recording its latency or failure; the budget is already spent"""
+        started = time.monotonic()
+        try:
+            response = self.transports[endpoint.url].make_request(method, params)
+        except SYNC_FAILURES as e:
+            endpoint.health.record_failure(time.time())
+            logger.warning(f"RPC endpoint {endpoint.name} failed {method}: {str(e)}")
+            raise
+        endpoint.health.record_success(time.monotonic() - started, time.time())
+        return response
+
+    def _failover(self, endpoints: List[RpcEndpoint], method, params, last_error: Optional[Exception] = None):
+        """Try endpoints in order until one answers"""
+        for endpoint in endpoints:
+            try:
+                endpoint.budget.acquire(method)
+                return self._send(endpoint, method, params)
+            except (RpcBudgetExceeded, *SYNC_FAILURES) as e:
+                last_error = e
+
+        raise last_error
+
+    def _hedged(self, endpoints: List[RpcEndpoint], method, params):
+        """Race a second endpoint against the primary once it is slower than its usual p95"""
+        primary, rest = endpoints[0], endpoints[1:]
+        try:
+            primary.budget.acquire(method)
+        except RpcBudgetExceeded as e:
+            return self._failover(rest, method, params, e)
+
+        attempts = {self.executor.submit(self._send, primary, method, params): primary}
+        done, _ = wait(attempts, timeout=self.pool.hedge_delay(primary))
+        if not done:
+            backup = self.pool.hedge_endpoint(rest, method)
+            if backup is not None:
+                attempts[self.executor.submit(self._send, backup, method, params)] = backup
+
+        last_error: Optional[Exception] = None
+        for attempt in as_completed(attempts):
+            try:
+                # The slower request finishes in the background and still updates its endpoint's health
+                return attempt.result()
+            except SYNC_FAILURES as e:
+                last_error = e
+
+        raced = list(attempts.values())
+        return self._failover([endpoint for endpoint in rest if endpoint not in raced], method, params, last_error)
+
+    def make_request(self, method, params):
+        endpoints = self.pool.ranked()
+        if self.pool.should_hedge(method):
+            return self._hedged(endpoints, method, params)
+        return self._failover(endpoints, method, params)
+
+    def make_batch(self, batch: List[Dict[str, Any]]) -> Any:
+        """POST a JSON-RPC batch to the healthiest endpoint, failing over like make_request.
+
+        Returns the decoded response body: normally a list of responses,
+        but a provider that rejects the batch as a whole answers with a
+        single error object.
+        """
+        methods = [request['method'] for request in batch]
+        last_error: Optional[Exception] = None
+        for endpoint in self.pool.ranked():
+            try:
+                endpoint.budget.acquire_batch(methods)
+            except RpcBudgetExceeded as e:
+                last_error = e
+                continue
+
+            started = time.monotonic()
+            try:
+                response = self.sessions[endpoint.url].post(endpoint.url, json=batch, timeout=RPC_TIMEOUT)
+                response.raise_for_status()
+                body = response.json()
+            except SYNC_FAILURES as e:
+                endpoint.health.record_failure(time.time())
+                logger.warning(f"RPC endpoint {endpoint.name} failed a batch of {len(batch)}: {str(e)}")
+                last_error = e
+                continue
+
+            endpoint.health.record_success(time.monotonic() - started, time.time())
+            return body
+
+        raise last_error
+
+
+class AsyncPooledHTTPProvider(AsyncHTTPProvider):
+    """asyncio counterpart of PooledHTTPProvider"""
+
+    def __init__(self, pool: RpcPool):
+        super().__init__(pool.endpoints[0].url)
+        self.pool = pool
+        self.transports = {
+            endpoint.url: AsyncHTTPProvider(
+                endpoint.url,
+                request_kwargs={'timeout': aiohttp.ClientTimeout(total=RPC_TIMEOUT)},
+                exception_retry_configuration=None
+            )
+            for endpoint in pool.endpoints
+        }
+        self.sessions_task: Optional[asyncio.Future] = None
+
+    async def _cache_sessions(self) -> None:
+        """Give each endpoint a keep-alive session; sessions must be created on the running loop"""
+        for transport in self.transports.values():
+            connector = aiohttp.TCPConnector(limit_per_host=POOL_CONNECTIONS, keepalive_timeout=KEEPALIVE_TIMEOUT)
+            await transport.cache_async_session(aiohttp.ClientSession(connector=connector, raise_for_status=True))
+
+    async def make_request(self, method, params):
+        if self.sessions_task is None:
+            self.sessions_task = asyncio.ensure_future(self._cache_sessions())
+        await self.sessions_task
+
+        endpoints = self.pool.ranked()
+        if self.pool.should_hedge(method):
+            return await self._hedged(endpoints, method, params)
+        return await self._failover(endpoints, method, params)
+
+    async def _send(self, endpoint: RpcEndpoint, method, params):
+        started = time.monotonic()
+        try:
+            response = await self.transports[endpoint.url].make_request(method, params)
+        except ASYNC_FAILURES as e:
+            endpoint.health.record_failure(time.time())
+            logger.warning(f"RPC endpoint {endpoint.name} failed {method}: {str(e)}")
+            raise
+        endpoint.health.record_success(time.monotonic() - started, time.time())
+        return response
+
+    async def _failover(self, endpoints: List[RpcEndpoint], method, params,
+                        last_error: Optional[Exception] = None):
+        for endpoint in endpoints:
+            try:
+                await endpoint.budget.acquire_async(method)
+                return await self._send(endpoint, method, params)
+            except (RpcBudgetExceeded, *ASYNC_FAILURES) as e:
+                last_error = e
+
+        raise last_error
+
+    async def _hedged(self, endpoints: List[RpcEndpoint], method, params):
+        primary, rest = endpoints[0], endpoints[1:]
+        try:
+            await primary.budget.acquire_async(method)
+        except RpcBudgetExceeded as e:
+            return await self._failover(rest, method, params, e)
+
+        attempts = {asyncio.ensure_future(self._send(primary, method, params)): primary}
+        done, _ = await asyncio.wait(attempts, timeout=self.pool.hedge_delay(primary))
+        if not done:
+            # Spending a budget touches SQLite, which may block on another process's lock
+            backup = await asyncio.to_thread(self.pool.hedge_endpoint, rest, method)
+            if backup is not None:
+                attempts[asyncio.ensure_future(self._send(backup, method, params))] = backup
+
+        last_error: Optional[Exception] = None
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results = []
+            for attempt in done:
+                try:
+                    results.append(attempt.result())
+                except ASYNC_FAILURES as e:
+                    last_error = e
+            if results:
+                for attempt in pending:
+                    attempt.cancel()
+                return results[0]
+
+        raced = list(attempts.values())
+        remaining = [endpoint for endpoint in rest if endpoint not in raced]
+        return await self._failover(remaining, method, params, last_error)
+
+    async def disconnect(self) -> None:
+        for transport in self.transports.values():
+            await transport.disconnect()
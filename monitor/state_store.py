@@ -0,0 +1,110 @@
+import os
+import json
+import tempfile
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def state_path(filename: str) -> str:
+    """Resolve a state file name inside STATE_DIR (defaults to the working directory)"""
+    state_dir = os.getenv('STATE_DIR', '.')
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, filename)
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """Write JSON so that readers see either the old file or the new one, never a partial write"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def load_json(path: str, default: Any = None) -> Any:
+    """Load a JSON state file, returning default if it doesn't exist or is unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state file {path}: {str(e)}")
+        return default
+
+
+class BlockCursor:
+    """Durable record of the last block whose events were fully processed"""
+
+    def __init__(self, filename: str, contract_address: str):
+        self.path = state_path(filename)
+        self.contract_address = contract_address.lower()
+
+    def load(self) -> Optional[int]:
+        state = load_json(self.path)
+        if not state:
+            return None
+        # A cursor saved for another contract says nothing about this one
+        if state.get('contract', '').lower() != self.contract_address:
+            logger.warning(f"Ignoring cursor in {self.path} saved for contract {state.get('contract')}")
+            return None
+        return int(state['last_processed_block'])
+
+    def save(self, block_number: int) -> None:
+        atomic_write_json(self.path, {
+            'contract': self.contract_address,
+            'last_processed_block': block_number
+        })
+
+
+class BackfillCheckpoint:
+    """Progress of a historical backfill over one block range, so an interrupted run can resume.
+
+    Saved after every committed window together with the running totals,
+    so a resumed run reports the same statistics as an uninterrupted one.
+    """
+
+    def __init__(self, filename: str, contract_address: str, start_block: int, end_block: int):
+        self.path = state_path(filename)
+        self.contract_address = contract_address.lower()
+        self.start_block = start_block
+        self.end_block = end_block
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        state = load_json(self.path)
+        if not state:
+            return None
+        # Only a checkpoint of the same contract and range tells us where to pick up
+        saved_range = (state.get('contract', '').lower(), state.get('start_block'), state.get('end_block'))
+        if saved_range != (self.contract_address, self.start_block, self.end_block):
+            logger.warning(
+                f"Ignoring checkpoint in {self.path} saved for blocks "
+                f"{state.get('start_block')} to {state.get('end_block')} of contract {state.get('contract')}"
+            )
+            return None
+        return state
+
+    def save(self, last_block: int, stats: Dict[str, Any]) -> None:
+        atomic_write_json(self.path, {
+            'contract': self.contract_address,
+            'start_block': self.start_block,
+            'end_block': self.end_block,
+            'last_block': last_block,
+            **stats
+        })
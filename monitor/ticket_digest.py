@@ -0,0 +1,73 @@
+from collections import Counter
+from typing import List, Dict, Any, Tuple
+
+from dedup import event_key
+
+
+class TicketDigest:
+    """Rolls TicketPurchased events up into one summary per game per window.
+
+    Windows are measured in blocks rather than wall-clock time, so a
+    catch-up after downtime produces the same summaries as live polling.
+    A window keeps its events until it is drained, so the caller can mark
+    them delivered only once their summary is staged; an event added twice
+    (streamed, then polled) is counted once.
+    """
+
+    def __init__(self, window_blocks: int, top_buyers: int = 3, sample_size: int = 5):
+        self.window_blocks = window_blocks
+        self.top_buyers = top_buyers
+        self.sample_size = sample_size
+        # (window index, game number) -> event key -> event
+        self.windows: Dict[Tuple[int, int], Dict[Tuple[bytes, int], Dict[str, Any]]] = {}
+
+    def window_start(self, block_number: int) -> int:
+        """First block of the window containing block_number"""
+        return block_number // self.window_blocks * self.window_blocks
+
+    def add(self, event: Dict[str, Any]) -> None:
+        key = (event['blockNumber'] // self.window_blocks, event['args']['gameNumber'])
+        self.windows.setdefault(key, {}).setdefault(event_key(event), event)
+
+    def discard(self, event: Dict[str, Any]) -> None:
+        """Drop an event that is no longer on the chain"""
+        key = (event['blockNumber'] // self.window_blocks, event['args']['gameNumber'])
+        window = self.windows.get(key, {})
+        window.pop(event_key(event), None)
+        if not window:
+            self.windows.pop(key, None)
+
+    def discard_after(self, block_number: int) -> None:
+        """Drop events above block_number, whose blocks a reorg orphaned"""
+        for key in list(self.windows):
+            window = {
+                log: event for log, event in self.windows[key].items() if event['blockNumber'] <= block_number
+            }
+            if window:
+                self.windows[key] = window
+            else:
+                del self.windows[key]
+
+    def drain(self, up_to_block: int) -> List[Dict[str, Any]]:
+        """Remove and return summaries for windows that end at or before up_to_block"""
+        summaries = []
+        for key in sorted(self.windows):
+            window_index, game_number = key
+            if (window_index + 1) * self.window_blocks - 1 > up_to_block:
+                continue
+            events = sorted(self.windows.pop(key).values(), key=lambda e: (e['blockNumber'], e['logIndex']))
+            buyers = Counter(event['args']['player'] for event in events)
+            summaries.append({
+                'game_number': game_number,
+                'first_block': events[0]['blockNumber'],
+                'last_block': events[-1]['blockNumber'],
+                'tickets': len(events),
+                'unique_players': len(buyers),
+                'top_buyers': buyers.most_common(self.top_buyers),
+                'samples': [
+                    (list(event['args']['numbers']), event['args']['etherball'])
+                    for event in events[:self.sample_size]
+                ],
+                'events': events
+            })
+        return summaries
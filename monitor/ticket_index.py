@@ -0,0 +1,232 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from eth_abi.packed import encode_packed
+from eth_utils import keccak
+
+from dedup import event_key
+from event_store import EventStore
+
+INITIAL_CAPACITY = 1024
+
+# Prize tiers and how many leading values of (n1, n2, n3, etherball) each has to match
+PRIZE_TIERS = {'gold': 4, 'silver': 3, 'bronze': 2}
+
+
+def tier_keys(numbers: List[int], etherball: int) -> Dict[str, bytes]:
+    """Each tier's key for a combination, hashed like the contract's gold/silver/bronzeTicketCounts keys"""
+    values = [*numbers, etherball]
+    return {
+        tier: keccak(encode_packed(['uint256'] * length, values[:length]))
+        for tier, length in PRIZE_TIERS.items()
+    }
+
+
+class _Column:
+    """Append-only NumPy column that doubles its capacity as it grows.
+
+    Values start in a narrow dtype and the column is widened the first
+    time one doesn't fit, so picks in the usual ranges cost a byte each.
+    """
+
+    def __init__(self, dtype: Any, capacity: int = INITIAL_CAPACITY):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.max_value = int(np.iinfo(dtype).max)
+        self.size = 0
+
+    def append(self, value: int) -> None:
+        if value > self.max_value:
+            self.data = self.data.astype(np.promote_types(self.data.dtype, np.min_scalar_type(value)))
+            self.max_value = int(np.iinfo(self.data.dtype).max)
+        if self.size == len(self.data):
+            self.data = np.resize(self.data, len(self.data) * 2)
+        self.data[self.size] = value
+        self.size += 1
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+def log_id(event: Dict[str, Any]) -> int:
+    """event_key packed into one int: the first 8 bytes of the tx hash and the log index"""
+    tx_hash, log_index = event_key(event)
+    return int.from_bytes(tx_hash[:8], 'big') << 32 | log_index
+
+
+class GameTickets:
+    """Every ticket of one game as parallel columns: three numbers, etherball, player id and block.
+
+    About 12 bytes per ticket in the columns, so a million tickets fit in
+    roughly 12 MB, and the statistics below are single vectorized passes
+    over them. Players are interned to ids. Tickets may arrive in any
+    order; each log is indexed once, by its (txHash, logIndex).
+    """
+
+    def __init__(self, game_number: int):
+        self.game_number = game_number
+        self.numbers = [_Column(np.uint8) for _ in range(3)]
+        self.etherball = _Column(np.uint8)
+        self.player = _Column(np.uint32)
+        self.block = _Column(np.uint32)
+        self.player_ids: Dict[str, int] = {}
+        self.players: List[str] = []
+        self.log_ids: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self.block.size
+
+    def add(self, event: Dict[str, Any]) -> bool:
+        """Index a TicketPurchased event; False if it was already indexed"""
+        log = log_id(event)
+        if log in self.log_ids:
+            return False
+        self.log_ids.add(log)
+
+        args = event['args']
+        for column, number in zip(self.numbers, args['numbers']):
+            column.append(number)
+        self.etherball.append(args['etherball'])
+        player = args['player']
+        player_id = self.player_ids.get(player.lower())
+        if player_id is None:
+            player_id = self.player_ids[player.lower()] = len(self.players)
+            self.players.append(player)
+        self.player.append(player_id)
+        self.block.append(event['blockNumber'])
+        return True
+
+    def number_frequency(self) -> np.ndarray:
+        """Picks per main number, indexed by the number"""
+        return np.bincount(np.concatenate([column.values for column in self.numbers]))
+
+    def etherball_frequency(self) -> np.ndarray:
+        """Picks per etherball, indexed by the etherball"""
+        return np.bincount(self.etherball.values)
+
+    def hot_numbers(self, count: int = 5) -> List[Tuple[int, int]]:
+        """The most picked main numbers as (number, picks)"""
+        return self._ranked(self.number_frequency(), count, hottest=True)
+
+    def cold_numbers(self, count: int = 5, max_number: Optional[int] = None) -> List[Tuple[int, int]]:
+        """The least picked main numbers from 1 to max_number (default: the highest picked) as (number, picks)"""
+        frequency = self.number_frequency()
+        if max_number is not None:
+            # Numbers nobody picked are the coldest of all
+            frequency = np.pad(frequency, (0, max(max_number + 1 - len(frequency), 0)))[:max_number + 1]
+        return self._ranked(frequency, count, hottest=False)
+
+    def hot_etherballs(self, count: int = 3) -> List[Tuple[int, int]]:
+        return self._ranked(self.etherball_frequency(), count, hottest=True)
+
+    @staticmethod
+    def _ranked(frequency: np.ndarray, count: int, hottest: bool) -> List[Tuple[int, int]]:
+        # Number 0 is never a valid pick
+        candidates = np.arange(1, len(frequency))
+        picks = frequency[1:]
+        if hottest:
+            candidates, picks = candidates[picks > 0], picks[picks > 0]
+        # Stable sort keeps lower numbers first among ties
+        order = np.argsort(-picks if hottest else picks, kind='stable')[:count]
+        return [(int(candidates[i]), int(picks[i])) for i in order]
+
+    def combination_keys(self) -> np.ndarray:
+        """Each ticket's numbers and etherball packed into one integer, 16 bits apiece"""
+        n1, n2, n3 = (column.values.astype(np.uint64) for column in self.numbers)
+        return (n1 << 48) | (n2 << 32) | (n3 << 16) | self.etherball.values.astype(np.uint64)
+
+    def combination_counts(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Distinct combinations and how many tickets picked each"""
+        return np.unique(self.combination_keys(), return_counts=True)
+
+    def duplicate_combinations(self) -> Tuple[int, int]:
+        """(combinations picked more than once, tickets holding one of them)"""
+        _, counts = self.combination_counts()
+        shared = counts[counts > 1]
+        return len(shared), int(shared.sum())
+
+    def most_picked_combinations(self, count: int = 3) -> List[Tuple[Tuple[int, int, int, int], int]]:
+        """The most picked (n1, n2, n3, etherball) combinations with their ticket counts"""
+        keys, counts = self.combination_counts()
+        order = np.argsort(-counts, kind='stable')[:count]
+        return [
+            (tuple(int(keys[i]) >> shift & 0xFFFF for shift in (48, 32, 16, 0)), int(counts[i]))
+            for i in order
+        ]
+
+    def winners(self, numbers: List[int], etherball: int) -> Dict[str, Dict[str, Any]]:
+        """Winning tickets and players of every prize tier in one pass over the columns.
+
+        A tier matches on the leading values of the packed combination
+        key, which selects the same tickets as the contract's keccak key
+        for that tier (returned as 'key'). Like the contract's counts, a
+        gold ticket also counts as silver and bronze.
+        """
+        keys = self.combination_keys()
+        winning = (numbers[0] << 48) | (numbers[1] << 32) | (numbers[2] << 16) | etherball
+        contract_keys = tier_keys(numbers, etherball)
+
+        results = {}
+        for tier, length in PRIZE_TIERS.items():
+            shift = np.uint64(16 * (4 - length))
+            matched = (keys >> shift) == np.uint64(winning >> int(shift))
+            results[tier] = {
+                'key': contract_keys[tier],
+                'tickets': int(np.count_nonzero(matched)),
+                'players': [self.players[player_id] for player_id in np.unique(self.player.values[matched])]
+            }
+        return results
+
+    def last_block(self) -> int:
+        return int(self.block.values.max()) if len(self) else -1
+
+    def tickets_of(self, player: str) -> int:
+        player_id = self.player_ids.get(player.lower())
+        if player_id is None:
+            return 0
+        return int(np.count_nonzero(self.player.values == player_id))
+
+
+class TicketIndex:
+    """GameTickets for the most recent games, fed from the event stream.
+
+    A game not in memory, e.g. after a restart, is rebuilt from the
+    EventStore the first time it is needed; events it already holds are
+    ignored when they are streamed again. Columns can't drop a ticket, so
+    games that held one a reorg removed are evicted and rebuilt from the
+    store, which has already dropped it.
+    """
+
+    def __init__(self, event_store: Optional[EventStore] = None, max_games: int = 3):
+        self.event_store = event_store
+        self.max_games = max_games
+        self.games: 'OrderedDict[int, GameTickets]' = OrderedDict()
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.game(event['args']['gameNumber']).add(event)
+
+    def discard(self, event: Dict[str, Any]) -> None:
+        """Forget the game of an event that is no longer on the chain"""
+        self.games.pop(event['args']['gameNumber'], None)
+
+    def discard_after(self, block_number: int) -> None:
+        """Forget every game holding tickets above block_number, whose blocks a reorg orphaned"""
+        for game_number in [number for number, game in self.games.items() if game.last_block() > block_number]:
+            del self.games[game_number]
+
+    def game(self, game_number: int) -> GameTickets:
+        game = self.games.get(game_number)
+        if game is not None:
+            self.games.move_to_end(game_number)
+            return game
+
+        game = GameTickets(game_number)
+        if self.event_store is not None:
+            for event in self.event_store.iter_events('TicketPurchased', game_number):
+                game.add(event)
+
+        self.games[game_number] = game
+        if len(self.games) > self.max_games:
+            self.games.popitem(last=False)
+        return game
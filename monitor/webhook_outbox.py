@@ -0,0 +1,72 @@
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Iterable, Tuple
+
+from state_store import state_path
+
+
+class WebhookOutbox:
+    """On-disk outbox every rendered embed passes through before it is sent.
+
+    Rows are written in one transaction per block window, before the
+    block cursor moves past that window, and deleted only once Discord has
+    accepted them. A crash or Discord outage therefore delays
+    notifications instead of losing them (at-least-once delivery).
+    """
+
+    def __init__(self, filename: str = 'outbox.db'):
+        # Delivery workers update rows from their own threads
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(state_path(filename), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                webhook_url TEXT NOT NULL,
+                embed TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, id)")
+        self.db.commit()
+
+    def add_many(self, messages: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Save (webhook_url, embed) pairs in a single transaction; returns them with their row ids"""
+        saved = []
+        now = time.time()
+        with self.lock:
+            with self.db:
+                for webhook_url, embed in messages:
+                    cursor = self.db.execute(
+                        "INSERT INTO outbox (webhook_url, embed, created_at) VALUES (?, ?, ?)",
+                        (webhook_url, json.dumps(embed), now)
+                    )
+                    saved.append((cursor.lastrowid, webhook_url, embed))
+        return saved
+
+    def pending(self) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Undelivered rows in the order they were written"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, webhook_url, embed FROM outbox WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+        return [(message_id, webhook_url, json.loads(embed)) for message_id, webhook_url, embed in rows]
+
+    def delete(self, message_ids: Iterable[int]) -> None:
+        """Drop delivered rows"""
+        with self.lock:
+            with self.db:
+                self.db.executemany("DELETE FROM outbox WHERE id = ?", [(message_id,) for message_id in message_ids])
+
+    def mark_failed(self, message_ids: Iterable[int]) -> None:
+        """Park rows Discord rejected outright so they aren't replayed forever"""
+        with self.lock:
+            with self.db:
+                self.db.executemany(
+                    "UPDATE outbox SET status = 'failed' WHERE id = ?",
+                    [(message_id,) for message_id in message_ids]
+                )
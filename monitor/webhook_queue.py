@@ -0,0 +1,298 @@
+import json
+import time
+import queue
+import logging
+import threading
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+
+import requests
+
+from webhook_outbox import WebhookOutbox
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+SERVER_ERROR_STATUSES = {500, 502, 503, 504}
+REQUEST_TIMEOUT = 30  # seconds
+
+# Discord accepts up to 10 embeds and 6000 embed characters in one webhook message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_CHARACTERS = 6000
+BATCH_LINGER = 1.0  # seconds to wait for more embeds before sending a partial message
+
+# Outcomes of a delivery attempt
+DELIVERED = 'delivered'
+REJECTED = 'rejected'  # Discord refused the message; retrying won't help
+UNAVAILABLE = 'unavailable'  # Gave up for now; the message stays in the outbox
+OUTAGE_RETRY_DELAY = 60  # seconds
+
+# What a single response asks for, short of DELIVERED or REJECTED
+RATE_LIMITED = 'rate_limited'  # Try again once the rate limit allows
+SERVER_ERROR = 'server_error'  # Try again after a backoff
+
+
+def embed_size(embed: Dict[str, Any]) -> int:
+    """Characters Discord counts against the per-message embed limit"""
+    size = len(embed.get('title', '')) + len(embed.get('description', ''))
+    size += len(embed.get('footer', {}).get('text', '')) + len(embed.get('author', {}).get('name', ''))
+    for field in embed.get('fields', []):
+        size += len(field.get('name', '')) + len(field.get('value', ''))
+    return size
+
+
+def response_body(text: str) -> Dict[str, Any]:
+    """Parsed JSON body of a Discord response, or {} if there isn't one"""
+    try:
+        body = json.loads(text) if text else {}
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+class DiscordRateLimit:
+    """Token bucket for one webhook, refilled from Discord's X-RateLimit-* headers.
+
+    Discord reports how many requests are left in the current bucket and
+    when it resets, so we wait for the reset once the bucket is empty
+    instead of sending a request we know will get a 429.
+    """
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """Seconds to wait before the next request may be sent"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.remaining is not None and self.remaining <= 0 and now < self.reset_at:
+            return self.reset_at - now
+        return 0.0
+
+    def consume(self) -> None:
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def update(self, status: int, headers: Any, body: Dict[str, Any], now: float) -> None:
+        """Refresh the bucket from a Discord response"""
+        if headers.get('X-RateLimit-Remaining') is not None:
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+        if headers.get('X-RateLimit-Reset-After') is not None:
+            self.reset_at = now + float(headers['X-RateLimit-Reset-After'])
+
+        if status == 429:
+            retry_after = body.get('retry_after', headers.get('Retry-After', 1))
+            self.blocked_until = now + float(retry_after)
+
+
+class MessageBatch:
+    """Outbox messages packed into one webhook post, within Discord's per-message limits"""
+
+    def __init__(self, first: Tuple[int, Dict[str, Any]]):
+        self.messages = [first]
+        self.size = embed_size(first[1])
+
+    def full(self) -> bool:
+        return len(self.messages) >= MAX_EMBEDS_PER_MESSAGE
+
+    def add(self, message: Tuple[int, Dict[str, Any]]) -> bool:
+        """Add a message if it still fits; False if it has to start the next post"""
+        size = embed_size(message[1])
+        if self.size + size > MAX_MESSAGE_CHARACTERS:
+            return False
+        self.messages.append(message)
+        self.size += size
+        return True
+
+
+class WebhookChannels:
+    """Bookkeeping shared by the threaded and the asyncio webhook senders.
+
+    Embeds are staged and committed to the WebhookOutbox in one transaction
+    per block window, then put on their webhook's channel (a queue.Queue or
+    an asyncio.Queue) for a worker to pack into messages and post. This
+    class decides everything that doesn't need I/O: what fits in a post,
+    how long the rate limits say to wait, what a response means and what
+    happens to the outbox rows afterwards. Subclasses do the posting,
+    sleeping and queue waits.
+    """
+
+    def __init__(self, outbox: WebhookOutbox,
+                 on_delivered: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None):
+        self.outbox = outbox
+        self.on_delivered = on_delivered
+        # A global 429 pauses every webhook, not just the one that hit it
+        self.global_limit = DiscordRateLimit()
+        self.channels: Dict[str, Any] = {}
+        self.staged: List[Tuple[str, Dict[str, Any]]] = []
+
+    def _replay(self) -> None:
+        """Queue whatever a previous run saved but never delivered"""
+        pending = self.outbox.pending()
+        if pending:
+            logger.info(f"Replaying {len(pending)} undelivered webhooks from the outbox")
+        for message_id, webhook_url, embed in pending:
+            if webhook_url not in self.channels:
+                logger.warning(f"Skipping outbox message {message_id} for a webhook that is no longer configured")
+                continue
+            self.channels[webhook_url].put_nowait((message_id, embed))
+
+    def put(self, webhook_url: str, embed: Dict[str, Any]) -> None:
+        """Stage an embed; it is saved and sent on the next commit"""
+        self.staged.append((webhook_url, embed))
+
+    def commit(self) -> None:
+        """Save staged embeds to the outbox in one transaction and queue them for delivery"""
+        if not self.staged:
+            return
+        for message_id, webhook_url, embed in self.outbox.add_many(self.staged):
+            self.channels[webhook_url].put_nowait((message_id, embed))
+        self.staged = []
+
+    def _take_slot(self, rate_limit: DiscordRateLimit) -> float:
+        """Claim the next request of a webhook's bucket; returns how long to wait before sending it"""
+        now = time.monotonic()
+        wait = max(rate_limit.wait_time(now), self.global_limit.wait_time(now))
+        if wait > 0:
+            logger.info(f"Waiting {wait:.2f}s for Discord rate limit")
+        rate_limit.consume()
+        return wait
+
+    def _outcome(self, rate_limit: DiscordRateLimit, status: int, headers: Any, text: str, titles: str) -> str:
+        """Update the rate limits from a response and return DELIVERED, REJECTED, RATE_LIMITED or SERVER_ERROR"""
+        body = response_body(text)
+        rate_limit.update(status, headers, body, time.monotonic())
+
+        if status == 429:
+            if body.get('global'):
+                self.global_limit.update(429, headers, body, time.monotonic())
+            logger.warning(f"Rate limited by Discord, retrying in {body.get('retry_after', 1)}s")
+            return RATE_LIMITED
+        if status in SERVER_ERROR_STATUSES:
+            return SERVER_ERROR
+        if status >= 400:
+            logger.error(f"Failed to send webhook: HTTP {status} {text}")
+            return REJECTED
+
+        logger.info(f"Successfully sent webhook: {titles}")
+        return DELIVERED
+
+    @staticmethod
+    def _gave_up(titles: str) -> str:
+        logger.error(f"Failed to send webhook after {MAX_ATTEMPTS} attempts: {titles}")
+        return UNAVAILABLE
+
+    def _settle(self, webhook_url: str, batch: List[Tuple[int, Dict[str, Any]]], result: str) -> bool:
+        """Record a post's final result in the outbox; True if its messages should be resent one at a time"""
+        if result == DELIVERED:
+            self.outbox.delete([message_id for message_id, _ in batch])
+            if self.on_delivered is not None:
+                self.on_delivered(webhook_url, [embed for _, embed in batch])
+            return False
+        if len(batch) > 1:
+            # One bad embed shouldn't sink the rest of the message
+            return True
+        self.outbox.mark_failed([message_id for message_id, _ in batch])
+        return False
+
+
+class WebhookQueue(WebhookChannels):
+    """Background webhook delivery with one queue and worker thread per webhook URL.
+
+    Callers stage embeds and commit them once per block window, so event
+    processing never waits on Discord. Each worker keeps its channel in
+    order, paces itself with that webhook's rate-limit bucket and packs
+    embeds queued close together into messages of up to
+    MAX_EMBEDS_PER_MESSAGE, while the channels drain concurrently. Rows
+    leave the outbox only once Discord accepts them; anything still there
+    at startup is replayed.
+    """
+
+    def __init__(self, webhook_urls: Iterable[str], create_session: Callable[[], requests.Session],
+                 outbox: WebhookOutbox,
+                 on_delivered: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None):
+        super().__init__(outbox, on_delivered)
+        self.create_session = create_session
+
+        for webhook_url in dict.fromkeys(webhook_urls):
+            channel: queue.Queue = queue.Queue()
+            self.channels[webhook_url] = channel
+            threading.Thread(target=self._worker, args=(webhook_url, channel), daemon=True).start()
+
+        self._replay()
+
+    def flush(self) -> None:
+        """Commit staged embeds and block until every queued one has been delivered or rejected"""
+        self.commit()
+        for channel in self.channels.values():
+            channel.join()
+
+    def _next_batch(self, channel: queue.Queue,
+                    first: Tuple[int, Dict[str, Any]]) -> Tuple[list, Optional[tuple]]:
+        """Collect messages that fit in one webhook post with first; returns (batch, held-over message)"""
+        batch = MessageBatch(first)
+        deadline = time.monotonic() + BATCH_LINGER
+
+        while not batch.full():
+            try:
+                message = channel.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if not batch.add(message):
+                return batch.messages, message
+
+        return batch.messages, None
+
+    def _send_batch(self, session: requests.Session, rate_limit: DiscordRateLimit,
+                    webhook_url: str, batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+        embeds = [embed for _, embed in batch]
+        result = self.deliver(session, rate_limit, webhook_url, embeds)
+        while result == UNAVAILABLE:
+            logger.warning(f"Discord unavailable, retrying {len(embeds)} embeds in {OUTAGE_RETRY_DELAY}s")
+            time.sleep(OUTAGE_RETRY_DELAY)
+            result = self.deliver(session, rate_limit, webhook_url, embeds)
+
+        if self._settle(webhook_url, batch, result):
+            for message in batch:
+                self._send_batch(session, rate_limit, webhook_url, [message])
+
+    def _worker(self, webhook_url: str, channel: queue.Queue) -> None:
+        session = self.create_session()
+        rate_limit = DiscordRateLimit()
+        held_over = None
+        while True:
+            first = held_over if held_over is not None else channel.get()
+            batch, held_over = self._next_batch(channel, first)
+            try:
+                self._send_batch(session, rate_limit, webhook_url, batch)
+            except Exception as e:
+                # The rows stay in the outbox and are replayed on the next start
+                logger.error(f"Failed to send webhook: {str(e)}")
+            finally:
+                for _ in batch:
+                    channel.task_done()
+
+    def deliver(self, session: requests.Session, rate_limit: DiscordRateLimit,
+                webhook_url: str, embeds: List[Dict[str, Any]]) -> str:
+        """Post one message, waiting out rate limits and retrying server errors"""
+        payload = {"embeds": embeds}
+        titles = ', '.join(embed.get('title', 'No title') for embed in embeds)
+
+        for attempt in range(MAX_ATTEMPTS):
+            time.sleep(self._take_slot(rate_limit))
+
+            try:
+                response = session.post(webhook_url, json=payload, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning(f"Webhook request failed: {str(e)}")
+                time.sleep(2 ** attempt)
+                continue
+
+            outcome = self._outcome(rate_limit, response.status_code, response.headers, response.text, titles)
+            if outcome in (DELIVERED, REJECTED):
+                return outcome
+            if outcome == SERVER_ERROR:
+                time.sleep(2 ** attempt)
+
+        return self._gave_up(titles)
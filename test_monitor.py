@@ -0,0 +1,335 @@
+# test_monitor.py
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from hexbytes import HexBytes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor'))
+
+from dedup import DeliveryIndex
+from event_store import EventStore
+from historical_monitor import CHECKPOINT_FILE, EXPORT_CHECKPOINT_FILE, HistoricalMonitor, WebhookManager
+from monitor import CONTRACT_ADDRESS, EventHandler, LotteryMonitor
+from range_planner import BlockRangePlanner, is_overflow_error
+from reorg import ReorgTracker
+from state_store import BackfillCheckpoint, BlockCursor
+from ticket_digest import TicketDigest
+from ticket_index import TicketIndex
+
+WINDOW_BLOCKS = 25
+
+
+class RecordingWebhooks:
+    """Stands in for WebhookManager: staged embeds count as sent once committed"""
+    tickets_webhook = 'tickets'
+    events_webhook = 'events'
+
+    def __init__(self):
+        self.staged = []
+        self.sent = []
+
+    def send_webhook(self, webhook_url, embed):
+        self.staged.append((webhook_url, embed))
+        return True
+
+    def commit(self):
+        self.sent.extend(self.staged)
+        self.staged = []
+
+
+def ticket(block_number, log_index, game_number=7):
+    return {
+        'event': 'TicketPurchased',
+        'blockNumber': block_number,
+        'logIndex': log_index,
+        'transactionHash': HexBytes(bytes([block_number % 256, log_index]) * 16),
+        'blockHash': HexBytes(bytes([block_number % 256]) * 32),
+        'args': {'player': '0x' + 'ab' * 20, 'gameNumber': game_number, 'numbers': [1, 2, 3], 'etherball': 4}
+    }
+
+
+def start_monitor():
+    """A LotteryMonitor as __init__ builds it after a restart, minus the node connection"""
+    monitor = LotteryMonitor.__new__(LotteryMonitor)
+    monitor.webhook_manager = RecordingWebhooks()
+    monitor.event_store = EventStore()
+    monitor.event_handler = EventHandler(
+        None, monitor.webhook_manager, TicketDigest(WINDOW_BLOCKS), ticket_index=TicketIndex(monitor.event_store)
+    )
+    monitor.delivery_index = DeliveryIndex()
+    monitor.reorg_tracker = ReorgTracker()
+    monitor.cursor = BlockCursor('monitor_cursor.json', CONTRACT_ADDRESS)
+    monitor.last_processed_block = monitor.cursor.load() or 99
+    monitor._restore_ticket_digest()
+    monitor.orphaned_events = []
+    monitor.rescanned_keys = set()
+    return monitor
+
+
+def process(monitor, events, to_block):
+    monitor.event_store.add_many(events)
+    for event in events:
+        monitor.dispatch_event(event)
+    monitor._commit_block(to_block)
+
+
+def summarized_tickets(webhooks):
+    return sum(
+        int(field['value'])
+        for _, embed in webhooks.sent for field in embed['fields'] if field['name'] == 'Tickets'
+    )
+
+
+def test_open_window_survives_restart(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    tickets = [ticket(100 + i, 0) for i in range(10)]
+
+    first = start_monitor()
+    process(first, tickets[:6], 110)
+    assert summarized_tickets(first.webhook_manager) == 0
+
+    # Restart mid-window: the open window is rebuilt from the store and flushed once it closes
+    second = start_monitor()
+    process(second, tickets[6:], 130)
+    assert summarized_tickets(second.webhook_manager) == 10
+    assert second.cursor.load() == 130
+    assert all(second.delivery_index.seen(event) for event in tickets)
+
+    # The summary and the marks were committed together, so nothing is posted again
+    third = start_monitor()
+    process(third, [], 160)
+    assert third.webhook_manager.sent == []
+
+
+def test_streamed_ticket_polled_again_is_counted_once(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    monitor = start_monitor()
+    event = ticket(110, 0)
+
+    monitor.event_store.add_many([event])
+    monitor.dispatch_event(event)
+    process(monitor, [event], 130)
+
+    assert summarized_tickets(monitor.webhook_manager) == 1
+
+
+def test_restored_ticket_without_block_hash_is_still_committed(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    legacy = ticket(105, 0)
+    del legacy['blockHash']
+
+    first = start_monitor()
+    process(first, [legacy], 110)
+
+    second = start_monitor()
+    process(second, [], 130)
+    assert summarized_tickets(second.webhook_manager) == 1
+    assert second.cursor.load() == 130
+    assert second.delivery_index.seen(legacy)
+
+
+def test_reorg_drops_orphaned_tickets_from_the_index(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    monitor = start_monitor()
+    monitor.event_handler.ticket_digest = None
+    kept, orphaned = ticket(100, 0), ticket(101, 0)
+    process(monitor, [kept, orphaned], 101)
+    assert len(monitor.event_handler.ticket_index.game(7)) == 2
+
+    # Block 101 was replaced; its ticket is re-mined in block 102
+    canonical = {100: kept['blockHash'], 101: HexBytes(b'\x66' * 32)}
+    monkeypatch.setattr(monitor, '_get_block_hash', canonical.get)
+    monitor._check_for_reorg()
+    assert monitor.last_processed_block == 100
+    assert len(monitor.event_handler.ticket_index.game(7)) == 1
+
+    remined = dict(orphaned, blockNumber=102, blockHash=HexBytes(b'\x66' * 32))
+    process(monitor, [remined], 102)
+    game = monitor.event_handler.ticket_index.game(7)
+    assert len(game) == 2
+    assert game.last_block() == 102
+
+
+def test_removed_streamed_log_drops_its_ticket_from_the_index(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    monitor = start_monitor()
+    monitor.event_handler.ticket_digest = None
+    tickets = [ticket(100, 0), ticket(101, 0)]
+    process(monitor, tickets, 101)
+
+    monkeypatch.setattr('monitor.EVENT_REGISTRY.decode', lambda log: tickets[1])
+    monitor.handle_streamed_log({'removed': True})
+    assert monitor.event_store.ticket_count(7) == 1
+    assert len(monitor.event_handler.ticket_index.game(7)) == 1
+
+
+def test_ticket_index_keeps_tickets_that_arrive_out_of_order():
+    game = TicketIndex().game(7)
+    assert game.add(ticket(110, 0))
+    # A polled gap-fill delivers an older ticket after a newer streamed one
+    assert game.add(ticket(105, 3))
+    assert not game.add(ticket(110, 0))
+    assert len(game) == 2
+
+
+class FixedPrizeCounts:
+    """Stands in for PrizeTierCounts with the contract's counts already known"""
+
+    def __init__(self, counts):
+        self.counts = counts
+
+    def get(self, game_number, keys):
+        return self.counts
+
+
+def winning_numbers_fields(tickets, contract_counts):
+    index = TicketIndex()
+    for event in tickets:
+        index.add(event)
+    webhooks = RecordingWebhooks()
+    handler = EventHandler(None, webhooks, ticket_index=index, prize_counts=FixedPrizeCounts(contract_counts))
+    handler.handle_winning_numbers_set({
+        'event': 'WinningNumbersSet',
+        'blockNumber': 200,
+        'logIndex': 0,
+        'transactionHash': HexBytes(b'\x99' * 32),
+        'args': {'gameNumber': 7, 'number1': 1, 'number2': 2, 'number3': 3, 'etherball': 4}
+    })
+    (_, embed), = webhooks.staged
+    return {field['name']: field['value'] for field in embed['fields']}
+
+
+def test_winners_with_tickets_missing_from_the_index():
+    fields = winning_numbers_fields([ticket(100, 0)], {'gold': 3, 'silver': 3, 'bronze': 3})
+    gold = fields['🥇 Gold Winners (3 tickets)']
+    assert '0xabab' in gold.lower()
+    assert '2 tickets missing from the local index' in gold
+
+
+def test_winners_with_extra_tickets_in_the_index():
+    fields = winning_numbers_fields([ticket(100, 0), ticket(101, 0)], {'gold': 1, 'silver': 1, 'bronze': 0})
+    gold = fields['🥇 Gold Winners (1 tickets)']
+    assert '1 extra tickets' in gold
+    assert '0xabab' not in gold.lower()
+    assert 'missing' not in gold
+    assert fields['🥉 Bronze Winners (0 tickets)'] == 'No winners'
+
+
+def test_winners_matching_the_contract_are_listed_plainly():
+    fields = winning_numbers_fields([ticket(100, 0)], {'gold': 1, 'silver': 1, 'bronze': 1})
+    assert '⚠️' not in fields['🥇 Gold Winners (1 tickets)']
+
+
+def test_resumed_backfill_adds_to_the_saved_webhook_totals(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    checkpoint = BackfillCheckpoint(CHECKPOINT_FILE, CONTRACT_ADDRESS, 100, 199)
+    checkpoint.save(149, {'elapsed_seconds': 5.0, 'events': {'TicketPurchased': 4}, 'webhooks': {'tickets': 3, 'events': 1}})
+
+    backfill = HistoricalMonitor.__new__(HistoricalMonitor)
+    backfill.start_block = 100
+    backfill.checkpoint = checkpoint
+    backfill.event_counts = {'TicketPurchased': 0}
+    backfill.webhook_manager = WebhookManager.__new__(WebhookManager)
+    # Delivered from the outbox replay before the checkpoint is read
+    backfill.webhook_manager.webhook_counts = {'tickets': 1, 'events': 0}
+    backfill._resume()
+
+    assert backfill.next_block == 150
+    assert backfill.event_counts == {'TicketPurchased': 4}
+    assert backfill.webhook_manager.get_stats() == {'tickets': 4, 'events': 1}
+
+
+def test_export_checkpoints_stretches_without_events(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    monkeypatch.setattr('historical_monitor.EXPORT_CHECKPOINT_INTERVAL', 0)
+
+    export = HistoricalMonitor.__new__(HistoricalMonitor)
+    export.start_block, export.end_block, export.next_block = 100, 1099, 100
+    export.output_dir = str(tmp_path / 'exports')
+    export.checkpoint = BackfillCheckpoint(EXPORT_CHECKPOINT_FILE, CONTRACT_ADDRESS, 100, 1099)
+    export.event_store = EventStore()
+    export.event_counts = {}
+    export.webhook_manager = None
+    export.blocks_processed, export.previous_elapsed, export.start_time = 0, 0.0, datetime.now()
+
+    def interrupted_after_empty_windows():
+        yield [(100, 299), (300, 499)], [[], []]
+        yield [(500, 699)], [[]]
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(export, 'fetched_windows', interrupted_after_empty_windows)
+    try:
+        export.export_events()
+    except KeyboardInterrupt:
+        pass
+
+    assert export.checkpoint.load()['last_block'] == 699
+    assert os.listdir(export.output_dir) == []
+
+
+def test_rate_limits_are_not_mistaken_for_oversized_ranges():
+    assert is_overflow_error(ValueError("query returned more than 10000 results (code -32005)"))
+    assert is_overflow_error(ValueError("Log response size exceeded."))
+    assert not is_overflow_error(ValueError("daily request count exceeded, request rate limited (code -32005)"))
+    assert not is_overflow_error(ValueError("daily request limit exceeded"))
+
+
+def test_failing_tail_window_keeps_the_learned_span(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    planner = BlockRangePlanner('https://node.example', initial_span=1000)
+
+    def get_logs(from_block, to_block):
+        if to_block - from_block >= 50:
+            raise ValueError("query returned more than 10000 results")
+        return [(from_block, to_block)]
+
+    # A 100-block tail splits on its own without shrinking the windows that come after it
+    assert planner.fetch(900, 999, get_logs) == [(900, 949), (950, 999)]
+    assert planner.span == 1000
+
+    planner.fetch(0, 999, get_logs)
+    assert planner.span < 100
+
+
+def test_delivery_marks_hold_no_write_lock_until_commit(tmp_path, monkeypatch):
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    index = DeliveryIndex()
+    delivered, reorged = ticket(100, 0), ticket(101, 0)
+    index.mark(delivered)
+    index.mark(reorged)
+    index.forget(reorged)
+    assert index.seen(delivered) and not index.seen(reorged)
+
+    # A backfill sharing the file can write while the monitor's marks are pending
+    with sqlite3.connect(str(tmp_path / 'delivered.db'), timeout=0) as other:
+        other.execute("INSERT INTO delivered VALUES (?, ?, ?)", (b'backfill', 0, 50))
+
+    index.commit()
+    reopened = DeliveryIndex()
+    assert reopened.seen(delivered) and not reopened.seen(reorged)
+
+
+def test_batched_windows_share_the_request_time(monkeypatch):
+    clock = iter([0.0, 8.0])
+    monkeypatch.setattr('monitor.time.monotonic', lambda: next(clock))
+
+    class OneRequestBatcher:
+        def call(self, calls):
+            return [[] for _ in calls]
+
+    class RecordingPlanner:
+        def __init__(self):
+            self.results = []
+
+        def record_result(self, span, result_count, elapsed):
+            self.results.append((span, elapsed))
+
+    monitor = LotteryMonitor.__new__(LotteryMonitor)
+    monitor.rpc_batcher = OneRequestBatcher()
+    monitor.range_planner = RecordingPlanner()
+    monitor.contract = type('Contract', (), {'address': CONTRACT_ADDRESS})()
+    monitor.event_topics = []
+    monitor.get_events_batch([(100, 199), (200, 299), (300, 399), (400, 499)])
+    assert monitor.range_planner.results == [(100, 2.0)] * 4